@@ -1,5 +1,4 @@
 import os
-import json
 import re
 import uuid
 from docx import Document
@@ -7,6 +6,12 @@ from pptx import Presentation
 from pptx.util import Inches, Pt
 from dotenv import load_dotenv
 from prompt_templates import GENERATE_SLIDE_CONTENT_TEMPLATE
+from anthropic_http import create_message
+from llm_cache import cached_call, make_cache_key, print_cache_stats
+from rate_limiter import acquire, estimate_tokens, print_limiter_stats
+from retry_policy import call_with_retries
+from single_flight import single_flight, print_flight_stats
+from replay_harness import print_replay_stats
 from figure_extractor import extract_figures_from_docx, decide_slide_mapping
 from PIL import Image
 from difflib import SequenceMatcher
@@ -19,24 +24,35 @@ def py_generatePrompt(promptTemplate, vars):
     return re.sub(r'\{\{(\w+)\}\}', replace_var, promptTemplate)
 
 def makeApiCall(apiKey, prompt):
-    import urllib.request
-    import ssl
-    url = "https://api.anthropic.com/v1/messages"
-    headers = {
-        'x-api-key': apiKey,
-        'anthropic-version': '2023-06-01',
-        'content-type': 'application/json'
-    }
-    data = json.dumps({
-        "model": "claude-3-5-sonnet-20241022",
-        "max_tokens": 4096,
-        "messages": [{"role": "user", "content": prompt}]
-    }).encode('utf-8')
-
-    req = urllib.request.Request(url, data=data, headers=headers, method='POST')
+    params = {"max_tokens": 4096}
+    # Identical prompts already in flight on another thread share that request
+    return single_flight(
+        make_cache_key("anthropic", "claude-3-5-sonnet-20241022", params, prompt),
+        lambda: cached_call(
+            "anthropic", "claude-3-5-sonnet-20241022", params, prompt,
+            lambda: requestClaudeMessage(apiKey, prompt)
+        )
+    )
+
+def requestClaudeMessage(apiKey, prompt, connectTimeout=None, readTimeout=None, retries=None, deadline=None):
+    import http.client
+    import urllib.error
+
+    def send():
+        acquire("anthropic", estimate_tokens(prompt) + 4096)
+        return create_message(
+            apiKey, prompt,
+            model="claude-3-5-sonnet-20241022",
+            max_tokens=4096,
+            connect_timeout=connectTimeout,
+            read_timeout=readTimeout
+        )
+
     try:
-        with urllib.request.urlopen(req) as response:
-            return json.loads(response.read())['content'][0]['text']
+        return call_with_retries(
+            send, (urllib.error.URLError, http.client.HTTPException, OSError),
+            max_attempts=retries, deadline=deadline, label="Anthropic"
+        )
     except Exception as e:
         print(f"API Error: {e}")
         return None
@@ -190,6 +206,10 @@ def main():
     output = os.path.join(base, "output/output_presentation.pptx")
 
     create_slides_with_inline_images(apiKey, wordDoc, template, output)
+    print_cache_stats()
+    print_limiter_stats()
+    print_flight_stats()
+    print_replay_stats()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,48 @@
+# single_flight.py
+#
+# In-process request coalescing. While a call for a given key is in flight,
+# identical calls from other threads wait for it and share its result instead
+# of sending their own upstream request.
+
+import threading
+
+in_flight = {}
+flight_lock = threading.Lock()
+flight_stats = {"calls": 0, "upstream": 0, "coalesced": 0}
+
+
+def single_flight(key, call):
+    with flight_lock:
+        flight_stats["calls"] += 1
+        flight = in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = {"done": threading.Event(), "result": None, "error": None}
+            in_flight[key] = flight
+            flight_stats["upstream"] += 1
+        else:
+            flight_stats["coalesced"] += 1
+
+    if not leader:
+        flight["done"].wait()
+        if flight["error"] is not None:
+            raise flight["error"]
+        return flight["result"]
+
+    try:
+        flight["result"] = call()
+        return flight["result"]
+    except BaseException as e:
+        flight["error"] = e
+        raise
+    finally:
+        with flight_lock:
+            in_flight.pop(key, None)
+        flight["done"].set()
+
+
+def print_flight_stats():
+    print(
+        f"[INFO] Single-flight: {flight_stats['calls']} calls, {flight_stats['upstream']} sent upstream, "
+        f"{flight_stats['coalesced']} coalesced"
+    )
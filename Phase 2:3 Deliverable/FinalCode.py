@@ -1,12 +1,18 @@
 import os
 import json
-import urllib.request
+import http.client
 import urllib.error
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from dotenv import load_dotenv
 from llama_cloud_services import LlamaParse
 from prompt_templates import ENRICH_PRESENTATION_PROMPT
+from anthropic_http import create_message
+from llm_cache import cached_call, make_cache_key, print_cache_stats
+from rate_limiter import acquire, estimate_tokens, print_limiter_stats
+from retry_policy import call_with_retries
+from single_flight import single_flight, print_flight_stats
+from replay_harness import replayable_parse, is_replaying, print_replay_stats
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,34 +20,51 @@ load_dotenv()
 LLAMA_CLOUD_API_KEY = os.getenv("LLAMA_CLOUD_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 
-if not LLAMA_CLOUD_API_KEY:
+# Replayed runs never reach the live services, so they don't need keys
+if not LLAMA_CLOUD_API_KEY and not is_replaying():
     raise ValueError("LLAMA_CLOUD_API_KEY must be set in the environment.")
-if not ANTHROPIC_API_KEY:
+if not ANTHROPIC_API_KEY and not is_replaying():
     raise ValueError("ANTHROPIC_API_KEY must be set in the environment.")
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
 intermediate_dir = os.path.join(base_dir, "intermediate")
 os.makedirs(intermediate_dir, exist_ok=True)
 
-def make_api_call(api_key, content):
-    url = "https://api.anthropic.com/v1/messages"
-    headers = {
-        'x-api-key': api_key,
-        'anthropic-version': '2023-06-01',
-        'content-type': 'application/json'
-    }
-    data = json.dumps({
-        "model": "claude-3-5-sonnet-20241022",
-        "max_tokens": 4096,
-        "messages": [{"role": "user", "content": content}]
-    }).encode('utf-8')
-
-    req = urllib.request.Request(url, data=data, headers=headers, method='POST')
+def is_json(text):
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
+def make_api_call(api_key, content, should_cache=None):
+    params = {"max_tokens": 4096}
+    # Identical prompts already in flight on another thread share that request
+    return single_flight(
+        make_cache_key("anthropic", "claude-3-5-sonnet-20241022", params, content),
+        lambda: cached_call(
+            "anthropic", "claude-3-5-sonnet-20241022", params, content,
+            lambda: request_claude_message(api_key, content),
+            should_cache=should_cache
+        )
+    )
+
+def request_claude_message(api_key, content, connect_timeout=None, read_timeout=None, retries=None, deadline=None):
+    def send():
+        acquire("anthropic", estimate_tokens(content) + 4096)
+        return create_message(
+            api_key, content,
+            model="claude-3-5-sonnet-20241022",
+            max_tokens=4096,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout
+        )
 
     try:
-        with urllib.request.urlopen(req) as response:
-            output = response.read()
-            return json.loads(output)['content'][0]['text']
+        return call_with_retries(
+            send, (urllib.error.URLError, http.client.HTTPException, OSError),
+            max_attempts=retries, deadline=deadline, label="Anthropic"
+        )
     except Exception as e:
         print(f"API error: {e}")
     return None
@@ -49,8 +72,10 @@ def make_api_call(api_key, content):
 def extract_document_data(doc_path):
     # Clear the images directory before each run
     
-    parser = LlamaParse(api_key=LLAMA_CLOUD_API_KEY, language="en", verbose=True)
-    result = parser.parse(doc_path)
+    result = replayable_parse(
+        doc_path, {"language": "en"},
+        lambda: LlamaParse(api_key=LLAMA_CLOUD_API_KEY, language="en", verbose=True).parse(doc_path)
+    )
 
     text_documents = result.get_text_documents(split_by_page=False)
     text = "\n".join(doc.text for doc in text_documents)
@@ -110,7 +135,8 @@ def enrich_with_claude(document_data):
         table_data=json.dumps(document_data['tables'], indent=2)
     )
 
-    response = make_api_call(ANTHROPIC_API_KEY, formatted_prompt)
+    # A cut-off or non-JSON reply is not cached, so a rerun asks again instead of failing the same way
+    response = make_api_call(ANTHROPIC_API_KEY, formatted_prompt, should_cache=is_json)
 
     if response is None:
         raise ValueError("Claude API call failed. No response received.")
@@ -285,6 +311,10 @@ def main():
         json.dump(claude_response, json_file, ensure_ascii=False, indent=4)
 
     create_ppt_from_claude(claude_response, document_data, output_ppt_path, template_path)
+    print_cache_stats()
+    print_limiter_stats()
+    print_flight_stats()
+    print_replay_stats()
 
 if __name__ == "__main__":
     main()
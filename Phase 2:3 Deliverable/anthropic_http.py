@@ -0,0 +1,121 @@
+# anthropic_http.py
+#
+# Pooled keep-alive HTTPS transport for the Anthropic Messages API. Connections
+# are reused across calls so a loop of requests only pays the TLS handshake
+# once, and every call gets its own connect and read timeouts.
+
+import io
+import os
+import json
+import ssl
+import threading
+import http.client
+import urllib.error
+
+from replay_harness import replayable_call
+
+ANTHROPIC_HOST = "api.anthropic.com"
+ANTHROPIC_MESSAGES_PATH = "/v1/messages"
+ANTHROPIC_VERSION = "2023-06-01"
+
+CONNECT_TIMEOUT = float(os.getenv("ANTHROPIC_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("ANTHROPIC_READ_TIMEOUT", "120"))
+POOL_SIZE = int(os.getenv("ANTHROPIC_POOL_SIZE", "4"))
+
+ssl_context = ssl.create_default_context()
+idle_connections = []
+pool_lock = threading.Lock()
+
+# Errors that mean a pooled connection was closed by the server while idle
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+
+def open_connection(host, connect_timeout):
+    conn = http.client.HTTPSConnection(host, timeout=connect_timeout, context=ssl_context)
+    conn.connect()
+    return conn
+
+
+def acquire_connection(host, connect_timeout):
+    with pool_lock:
+        for i in range(len(idle_connections) - 1, -1, -1):
+            if idle_connections[i].host == host:
+                return idle_connections.pop(i), True
+    return open_connection(host, connect_timeout), False
+
+
+def release_connection(conn):
+    with pool_lock:
+        if len(idle_connections) < POOL_SIZE:
+            idle_connections.append(conn)
+            return
+    conn.close()
+
+
+def close_all_connections():
+    with pool_lock:
+        while idle_connections:
+            idle_connections.pop().close()
+
+
+def post_json(path, payload, headers, host=ANTHROPIC_HOST, connect_timeout=None, read_timeout=None):
+    connect_timeout = CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+    read_timeout = READ_TIMEOUT if read_timeout is None else read_timeout
+    body = json.dumps(payload).encode("utf-8")
+    request_headers = dict(headers)
+    request_headers["content-type"] = "application/json"
+    request_headers["connection"] = "keep-alive"
+
+    while True:
+        conn, reused = acquire_connection(host, connect_timeout)
+        try:
+            conn.sock.settimeout(read_timeout)
+            conn.request("POST", path, body=body, headers=request_headers)
+            response = conn.getresponse()
+            data = response.read()
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if reused:
+                continue  # the idle connection went away, retry on a fresh one
+            raise
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            release_connection(conn)
+
+        if response.status >= 400:
+            raise urllib.error.HTTPError(
+                f"https://{host}{path}", response.status, response.reason,
+                response.headers, io.BytesIO(data)
+            )
+        return json.loads(data)
+
+
+def create_message(api_key, prompt, model="claude-3-5-sonnet-20241022", max_tokens=4096,
+                   connect_timeout=None, read_timeout=None, usage=None):
+    headers = {
+        "x-api-key": api_key,
+        "anthropic-version": ANTHROPIC_VERSION,
+    }
+    payload = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "messages": [{"role": "user", "content": prompt}],
+    }
+    result = replayable_call("anthropic", payload, lambda: post_json(
+        ANTHROPIC_MESSAGES_PATH, payload, headers,
+        connect_timeout=connect_timeout, read_timeout=read_timeout
+    ))
+    if usage is not None:
+        usage.update(result.get("usage") or {})
+    return result["content"][0]["text"]
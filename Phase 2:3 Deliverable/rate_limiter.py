@@ -0,0 +1,101 @@
+# rate_limiter.py
+#
+# Per-provider token-bucket rate limiter. Each provider has one bucket for
+# requests per minute and one for tokens per minute; a call blocks only when
+# one of them is empty, so requests run at full speed until the real quota
+# is reached.
+
+import os
+import time
+import threading
+
+RATE_LIMITS = {
+    "openai": {
+        "rpm": float(os.getenv("OPENAI_RPM", "500")),
+        "tpm": float(os.getenv("OPENAI_TPM", "80000")),
+    },
+    "anthropic": {
+        "rpm": float(os.getenv("ANTHROPIC_RPM", "50")),
+        "tpm": float(os.getenv("ANTHROPIC_TPM", "40000")),
+    },
+}
+
+buckets = {}
+limiter_lock = threading.Lock()
+limiter_stats = {"calls": 0, "throttled": 0, "wait_seconds": 0.0}
+
+
+def estimate_tokens(text):
+    # Rough English average of four characters per token
+    return max(1, len(text) // 4)
+
+
+def get_buckets(provider):
+    if provider not in buckets:
+        limits = RATE_LIMITS.get(provider, {"rpm": 60.0, "tpm": 60000.0})
+        now = time.monotonic()
+        buckets[provider] = {
+            "requests": {"capacity": limits["rpm"], "level": limits["rpm"], "updated": now},
+            "tokens": {"capacity": limits["tpm"], "level": limits["tpm"], "updated": now},
+        }
+    return buckets[provider]
+
+
+def refill(bucket, now):
+    elapsed = now - bucket["updated"]
+    bucket["level"] = min(bucket["capacity"], bucket["level"] + elapsed * bucket["capacity"] / 60.0)
+    bucket["updated"] = now
+
+
+def seconds_until_available(bucket, amount):
+    if bucket["level"] >= amount:
+        return 0.0
+    return (amount - bucket["level"]) * 60.0 / bucket["capacity"]
+
+
+def acquire(provider, tokens=0):
+    waited = 0.0
+    while True:
+        with limiter_lock:
+            provider_buckets = get_buckets(provider)
+            request_bucket = provider_buckets["requests"]
+            token_bucket = provider_buckets["tokens"]
+            # A single oversized request may use the whole bucket but never more
+            tokens = min(tokens, token_bucket["capacity"])
+
+            now = time.monotonic()
+            refill(request_bucket, now)
+            refill(token_bucket, now)
+            wait_time = max(
+                seconds_until_available(request_bucket, 1),
+                seconds_until_available(token_bucket, tokens)
+            )
+            if wait_time <= 0:
+                request_bucket["level"] -= 1
+                token_bucket["level"] -= tokens
+                limiter_stats["calls"] += 1
+                if waited:
+                    limiter_stats["throttled"] += 1
+                    limiter_stats["wait_seconds"] += waited
+                return waited
+
+        if not waited:
+            print(f"[Rate Limit] {provider} quota reached, waiting {wait_time:.1f}s...")
+        time.sleep(wait_time)
+        waited += wait_time
+
+
+def release_tokens(provider, tokens):
+    # Give back tokens that were reserved for a call but not used
+    if tokens <= 0:
+        return
+    with limiter_lock:
+        token_bucket = get_buckets(provider)["tokens"]
+        token_bucket["level"] = min(token_bucket["capacity"], token_bucket["level"] + tokens)
+
+
+def print_limiter_stats():
+    print(
+        f"[INFO] Rate limiter: {limiter_stats['calls']} calls, {limiter_stats['throttled']} throttled, "
+        f"{limiter_stats['wait_seconds']:.1f}s spent waiting"
+    )
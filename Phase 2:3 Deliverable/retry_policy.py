@@ -0,0 +1,119 @@
+# retry_policy.py
+#
+# Retry helper shared by the OpenAI and Anthropic callers. Waits honour the
+# server's retry hints (Retry-After, retry-after-ms, x-ratelimit-reset-*) and
+# otherwise back off exponentially with full jitter. Every call has a deadline,
+# so a retry is only attempted if it can still start before the deadline, and
+# callers can bound each attempt with remaining_time().
+
+import os
+import re
+import time
+import random
+import urllib.error
+from email.utils import parsedate_to_datetime
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "6"))
+RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))
+RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "60"))
+CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "300"))
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+def parse_duration(value):
+    # Parses OpenAI style reset values such as "20ms", "1.5s" or "6m0s"
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+def parse_retry_after(headers):
+    if not headers:
+        return None
+
+    def header(name):
+        value = headers.get(name) if hasattr(headers, "get") else None
+        return value.strip() if isinstance(value, str) and value.strip() else None
+
+    retry_after_ms = header("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = header("retry-after")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    resets = []
+    for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        value = header(name)
+        if value:
+            seconds = parse_duration(value)
+            if seconds is not None:
+                resets.append(seconds)
+    # Only the limit that was hit matters; the shorter reset is the earliest
+    # point worth retrying, and backoff covers the case where it wasn't enough
+    return min(resets) if resets else None
+
+
+def error_status(error):
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code
+    return getattr(error, "http_status", None)
+
+
+def is_retryable(error, retryable_errors):
+    if not isinstance(error, retryable_errors):
+        return False
+    status = error_status(error)
+    return status is None or status in RETRYABLE_STATUS
+
+
+def backoff_delay(attempt, retry_after=None):
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+    if retry_after is not None:
+        # The server knows when capacity frees up; add a little jitter so
+        # parallel workers don't all come back at the same instant
+        delay = max(delay, retry_after + random.uniform(0, RETRY_BASE_DELAY))
+    return delay
+
+
+def remaining_time(start, deadline):
+    # Timeout for the next attempt: whatever is left of the deadline (at least a second)
+    return max(1.0, deadline - (time.monotonic() - start))
+
+
+def call_with_retries(call, retryable_errors, max_attempts=None, deadline=None, label="LLM"):
+    # A single attempt is always made, even when retries are switched off
+    max_attempts = max(1, RETRY_MAX_ATTEMPTS if max_attempts is None else max_attempts)
+    deadline = CALL_DEADLINE if deadline is None else deadline
+    start = time.monotonic()
+
+    for attempt in range(max_attempts):
+        try:
+            return call()
+        except Exception as e:
+            if not is_retryable(e, retryable_errors):
+                raise
+            retry_after = parse_retry_after(getattr(e, "headers", None))
+            delay = backoff_delay(attempt, retry_after)
+            remaining = deadline - (time.monotonic() - start)
+            if attempt == max_attempts - 1 or delay >= remaining:
+                print(f"[Retry] {label} giving up after {attempt + 1} attempts: {e}")
+                raise
+            hint = f" (server asked for {retry_after:.1f}s)" if retry_after is not None else ""
+            print(f"[Retry] {label} attempt {attempt + 1} failed: {e}. Waiting {delay:.1f}s{hint}...")
+            time.sleep(delay)
@@ -1,18 +1,50 @@
 import os
+import sys
 import json
-import re
+import http.client
 import urllib.request
 import urllib.error
 import time
-import random
 import base64
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from dotenv import load_dotenv
 from llama_cloud_services import LlamaParse
-from prompt_templates import ENRICH_PRESENTATION_PROMPT, SLIDE_REFINEMENT_PROMPT, EXTRACT_TOPICS_MARKERS_TEMPLATE
+from prompt_templates import (
+    ENRICH_PRESENTATION_PROMPT, SLIDE_WINDOW_REFINEMENT_PROMPT, SLIDE_CONTINUATION_PROMPT, EXTRACT_TOPICS_MARKERS_TEMPLATE
+)
 from fuzzywuzzy import fuzz
+from llm_cache import cached_call, cache_get, cache_put, make_cache_key, hash_text, print_cache_stats
+from rate_limiter import acquire, release_tokens, print_limiter_stats
+from retry_policy import call_with_retries, remaining_time, CALL_DEADLINE, RETRYABLE_STATUS
+from llm_telemetry import llm_stage, bind_stage, current_stage, count_attempts, record_call, print_telemetry_summary
+from model_router import route_model, fallback_model
+from circuit_breaker import (
+    allow_request, is_available, wait_for_request, release_probe, record_success, record_failure, print_breaker_states
+)
+from anthropic_http import create_message
+from docx_extractor import extract_docx
+from parse_cache import cached_parse
+from image_pipeline import process_images
+from image_dedup import dedup_images, remove_duplicates
+from replay_harness import replayable_call, replayable_parse, is_replaying, print_replay_stats
+from provider_client import hedged_call, record_latency, print_hedge_stats
+from single_flight import single_flight, print_flight_stats
+from slide_stream import iter_slide_objects, is_slide_json, has_slides, parse_slide_array
+from batch_client import run_chat_batch
+from asset_index import (
+    anchor_span, build_asset_positions, chunk_word_offsets, cut_tracking_spans, locate_in_spans,
+    locate_pages, scope_assets, table_snippet
+)
+from slide_quality import slides_needing_refinement
+from table_removal import find_table_spans
+from refine_windows import plan_refine_windows, summarize_slides, merge_refined_windows
+from token_budget import (
+    count_tokens, expected_output_tokens, fit_segments, plan_max_tokens, split_text_by_tokens,
+    RESPONSE_OVERHEAD, TOKENS_PER_SLIDE
+)
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,79 +52,393 @@ load_dotenv()
 LLAMA_CLOUD_API_KEY = os.getenv("LLAMA_CLOUD_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 
-if not LLAMA_CLOUD_API_KEY:
+# "auto" parses .docx locally and sends everything else (or a failed local parse) to LlamaParse
+DOCUMENT_BACKEND = os.getenv("DOCUMENT_BACKEND", "auto")
+
+# Replayed runs never reach the live services, so they don't need keys
+if not LLAMA_CLOUD_API_KEY and DOCUMENT_BACKEND == "llamaparse" and not is_replaying():
     raise ValueError("LLAMA_CLOUD_API_KEY must be set in the environment.")
-if not ANTHROPIC_API_KEY:
+if not ANTHROPIC_API_KEY and not is_replaying():
     raise ValueError("ANTHROPIC_API_KEY must be set in the environment.")
 
 base_dir = os.path.dirname(os.path.abspath(__file__))
 intermediate_dir = os.path.join(base_dir, "intermediate")
 os.makedirs(intermediate_dir, exist_ok=True)
 
-def make_api_call_gpt(api_key, content, retries=3):
+# Number of topic segments enriched in parallel (1 = one after another)
+ENRICH_MAX_WORKERS = int(os.getenv("ENRICH_MAX_WORKERS", "4"))
+# Stream enrichment responses and parse slides as they arrive
+ENRICH_STREAM = os.getenv("ENRICH_STREAM", "0") == "1"
+# Size of the text chunks sent through topic extraction, in tokens
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "3000"))
+# Follow-up requests for the missing tail of a truncated slide array
+ENRICH_TAIL_RETRIES = int(os.getenv("ENRICH_TAIL_RETRIES", "2"))
+# Number of refinement windows sent in parallel
+REFINE_MAX_WORKERS = int(os.getenv("REFINE_MAX_WORKERS", "4"))
+# Topic markers are short: two lines per topic
+TOPICS_MAX_TOKENS = 1024
+# Slide generation is hedged across providers: the secondary gets the prompt if the
+# primary is slower than its recent p95 for that model or returns no valid slide JSON.
+# It doubles the spend on slow calls, so it is opt-in
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_PRIMARY_PROVIDER = os.getenv("LLM_PRIMARY_PROVIDER", "openai")
+CLAUDE_MODEL = "claude-3-5-sonnet-20241022"
+
+def make_api_call_gpt(api_key, content, retries=None, deadline=None, max_tokens=None, model=None, should_cache=None):
+    # Without an explicit model the current stage's route decides
+    model = model or route_model(current_stage(), content)
+    if max_tokens is None:
+        max_tokens = plan_max_tokens(content, model)
+    params = {"max_tokens": max_tokens, "temperature": 0.3}
+    # Identical prompts already in flight on another thread share that request
+    return single_flight(
+        make_cache_key("openai", model, params, content),
+        lambda: cached_call(
+            "openai", model, params, content,
+            lambda: request_gpt_completion(api_key, content, retries, deadline, max_tokens, model),
+            on_hit=record_cache_hit("openai", model, content),
+            should_cache=should_cache
+        )
+    )
+
+def record_cache_hit(provider, model, content):
+    return lambda response: record_call(
+        provider, model, count_tokens(content, model), count_tokens(response, model), cache_hit=True
+    )
+
+def openai_retryable_errors():
+    from openai.error import RateLimitError, APIConnectionError, APIError, Timeout, ServiceUnavailableError, TryAgain
+    return (RateLimitError, APIConnectionError, APIError, Timeout, ServiceUnavailableError, TryAgain)
+
+def rate_limited_chat_completion(prompt_tokens, request_timeout=None, **request):
+    import openai
+
+    # Reserve prompt + completion budget up front, then hand back what wasn't used
+    reserved = prompt_tokens + request.get("max_tokens", 0)
+    acquire("openai", reserved)
+    # request_timeout stays out of the fixture key: it changes with every attempt
+    response = replayable_call(
+        "openai", request, lambda: openai.ChatCompletion.create(**request, request_timeout=request_timeout)
+    )
+    usage = response.get("usage") or {}
+    if usage.get("total_tokens"):
+        release_tokens("openai", reserved - usage["total_tokens"])
+    return response
+
+def tracked_chat_completion(model, prompt_tokens, request, retries=None, deadline=None):
+    # One ledger entry per model call, however many attempts the retry policy needed.
+    # Each attempt may only run for what is left of the deadline, so a hung request can't overrun it
+    deadline = CALL_DEADLINE if deadline is None else deadline
+    start = time.monotonic()
+    attempt, attempts = count_attempts(lambda: rate_limited_chat_completion(
+        prompt_tokens, request_timeout=remaining_time(start, deadline), model=model, **request
+    ))
+    try:
+        response = call_with_retries(
+            attempt, openai_retryable_errors(),
+            max_attempts=retries, deadline=deadline, label=f"OpenAI {model}"
+        )
+    except Exception:
+        record_call("openai", model, prompt_tokens, latency=time.monotonic() - start,
+                    retries=attempts["count"] - 1, ok=False)
+        raise
+    usage = response.get("usage") or {}
+    record_call("openai", model, usage.get("prompt_tokens", prompt_tokens), usage.get("completion_tokens", 0),
+                time.monotonic() - start, attempts["count"] - 1)
+    return response
+
+def request_gpt_completion(api_key, content, retries=None, deadline=None, max_tokens=4096, model="gpt-4"):
     import openai
     from openai.error import RateLimitError, InvalidRequestError, AuthenticationError, APIConnectionError
 
     openai.api_key = api_key
 
-    for attempt in range(retries):
+    def create(model, tokens):
+        return tracked_chat_completion(
+            model,
+            count_tokens(content, model),
+            {"messages": [{"role": "user", "content": content}], "max_tokens": tokens, "temperature": 0.3},
+            retries,
+            deadline
+        )
+
+    # No model left to send to: don't claim (and then strand) the provider's probe
+    backup = fallback_model(model)
+    if not is_available(f"openai:{model}") and (backup is None or not is_available(f"openai:{backup}")):
+        print(f"[Circuit] {model} and its fallback are marked unavailable, skipping call.")
+        return None
+
+    # make_api_call_llm routes around an open breaker; topics, tables and captions
+    # have no other provider, so they wait for the probe rather than lose their chunk
+    if not wait_for_request("openai", CALL_DEADLINE if deadline is None else deadline):
+        print("[Circuit] OpenAI is still unavailable, skipping call.")
+        return None
+
+    def fallback(reason):
+        if backup is None:
+            print(f"{reason}, no fallback model for {model}")
+            release_probe("openai")
+            return None
+        print(f"{reason}, falling back to {backup}")
+        if not allow_request(f"openai:{backup}"):
+            print(f"[Circuit] {backup} is marked unavailable as well.")
+            release_probe("openai")
+            return None
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[{"role": "user", "content": content}],
-                max_tokens=4096,
-                temperature=0.3
-            )
+            start = time.monotonic()
+            response = create(backup, min(max_tokens, plan_max_tokens(content, backup)))
+            record_latency(f"openai:{backup}", time.monotonic() - start)
+            record_success("openai")
+            record_success(f"openai:{backup}")
             return response.choices[0].message.content.strip()
+        except InvalidRequestError as inner_e:
+            record_failure(f"openai:{backup}", trip=is_model_unavailable(inner_e))
+            print(f"Fallback failed: {inner_e}")
+            return None
+        except Exception as inner_e:
+            record_failure("openai")
+            print(f"Fallback failed: {inner_e}")
+            return None
 
-        except RateLimitError:
-            if attempt < retries - 1:
-                wait_time = random.uniform(2, 5)
-                print(f"[Rate Limit] Waiting {wait_time:.1f}s before retry...")
-                time.sleep(wait_time)
-                continue
-            else:
-                print("[Rate Limit] Giving up after retries.")
-                return None
-
-        except InvalidRequestError as e:
-            print("Model not available, falling back to gpt-3.5-turbo")
-            try:
-                response = openai.ChatCompletion.create(
-                    model="gpt-3.5-turbo",
-                    messages=[{"role": "user", "content": content}],
-                    max_tokens=4096,
-                    temperature=0.3
-                )
-                return response.choices[0].message.content.strip()
-            except Exception as inner_e:
-                print(f"Fallback failed: {inner_e}")
-                return None
+    # Once the routed model is known to be unavailable, go straight to the fallback model
+    if not allow_request(f"openai:{model}"):
+        return fallback(f"[Circuit] {model} is marked unavailable")
 
-        except (AuthenticationError, APIConnectionError) as e:
-            print(f"[Connection/Auth Error] {e}")
-            return None
+    try:
+        start = time.monotonic()
+        response = create(model, max_tokens)
+        record_latency(f"openai:{model}", time.monotonic() - start)
+        record_success("openai")
+        record_success(f"openai:{model}")
+        return response.choices[0].message.content.strip()
+
+    except InvalidRequestError as e:
+        # The provider answered; only a missing model counts against the model
+        record_success("openai")
+        if is_model_unavailable(e):
+            record_failure(f"openai:{model}", trip=True)
+        else:
+            record_success(f"openai:{model}")
+        return fallback("Model not available")
 
-        except Exception as e:
-            print(f"[Unknown OpenAI API error] {e}")
-            return None
+    except RateLimitError:
+        record_failure("openai")
+        print("[Rate Limit] Giving up after retries.")
+        return None
+
+    except AuthenticationError as e:
+        record_failure("openai", trip=True)
+        print(f"[Connection/Auth Error] {e}")
+        return None
+
+    except APIConnectionError as e:
+        record_failure("openai")
+        print(f"[Connection/Auth Error] {e}")
+        return None
+
+    except Exception as e:
+        record_failure("openai")
+        print(f"[Unknown OpenAI API error] {e}")
+        return None
+
+def is_model_unavailable(error):
+    message = str(error).lower()
+    return getattr(error, "code", None) == "model_not_found" or "does not exist" in message or "do not have access" in message
+
+def make_api_call_claude(api_key, content, retries=None, deadline=None, max_tokens=4096, should_cache=None):
+    params = {"max_tokens": max_tokens}
+    return single_flight(
+        make_cache_key("anthropic", CLAUDE_MODEL, params, content),
+        lambda: cached_call(
+            "anthropic", CLAUDE_MODEL, params, content,
+            lambda: request_claude_message(api_key, content, retries, deadline, max_tokens),
+            on_hit=record_cache_hit("anthropic", CLAUDE_MODEL, content),
+            should_cache=should_cache
+        )
+    )
+
+def request_claude_message(api_key, content, retries=None, deadline=None, max_tokens=4096):
+    usage = {}
+    prompt_tokens = count_tokens(content, CLAUDE_MODEL)
+
+    def send():
+        acquire("anthropic", prompt_tokens + max_tokens)
+        return create_message(api_key, content, model=CLAUDE_MODEL, max_tokens=max_tokens, usage=usage)
+
+    if not allow_request("anthropic"):
+        print("[Circuit] Anthropic is marked unavailable, skipping call.")
+        return None
+
+    attempt, attempts = count_attempts(send)
+    start = time.monotonic()
+    try:
+        response = call_with_retries(
+            attempt, (urllib.error.URLError, http.client.HTTPException, OSError),
+            max_attempts=retries, deadline=deadline, label="Anthropic"
+        )
+        record_latency(f"anthropic:{CLAUDE_MODEL}", time.monotonic() - start)
+        record_call("anthropic", CLAUDE_MODEL, usage.get("input_tokens", prompt_tokens), usage.get("output_tokens", 0),
+                    time.monotonic() - start, attempts["count"] - 1)
+        record_success("anthropic")
+        return response
+    except Exception as e:
+        record_call("anthropic", CLAUDE_MODEL, prompt_tokens, latency=time.monotonic() - start,
+                    retries=attempts["count"] - 1, ok=False)
+        return handle_claude_error(e)
+
+def handle_claude_error(e):
+    if isinstance(e, urllib.error.HTTPError):
+        if e.code in (401, 403, 404):
+            record_failure("anthropic", trip=True)
+        elif e.code in RETRYABLE_STATUS:
+            record_failure("anthropic")
+        else:
+            record_success("anthropic")  # a problem with this request, not the provider
+    else:
+        record_failure("anthropic")
+    print(f"[Anthropic API error] {e}")
+    return None
+
+def make_api_call_llm(content, max_tokens=None, validate=None, should_cache=None):
+    # validate decides whether an answer is good enough to stop hedging;
+    # should_cache whether it may be replayed from the cache on later runs
+    model = route_model(current_stage(), content)
+    if max_tokens is None:
+        max_tokens = plan_max_tokens(content, model)
+    providers = {
+        "openai": bind_stage(lambda: make_api_call_gpt(
+            os.getenv("OPENAI_API_KEY"), content, max_tokens=max_tokens, model=model, should_cache=should_cache
+        )),
+        "anthropic": bind_stage(lambda: make_api_call_claude(
+            ANTHROPIC_API_KEY, content, max_tokens=max_tokens, should_cache=should_cache
+        )),
+    }
+    primary = LLM_PRIMARY_PROVIDER if LLM_PRIMARY_PROVIDER in providers else "openai"
+    secondary = "anthropic" if primary == "openai" else "openai"
+    if not is_available(primary) and is_available(secondary):
+        print(f"[Circuit] {primary} is marked unavailable, routing to {secondary}.")
+        return providers[secondary]()
+    if not LLM_HEDGE or not is_available(secondary):
+        return providers[primary]()
+    routes = {"openai": f"openai:{model}", "anthropic": f"anthropic:{CLAUDE_MODEL}"}
+    return hedged_call((primary, providers[primary]), (secondary, providers[secondary]), validate, route=routes[primary])
+
+def stream_api_call_gpt(api_key, content, retries=None, deadline=None, max_tokens=None, model=None, should_cache=None):
+    import openai
+    from openai.error import InvalidRequestError
+
+    model = model or route_model(current_stage(), content)
+    if max_tokens is None:
+        max_tokens = plan_max_tokens(content, model)
+    params = {"max_tokens": max_tokens, "temperature": 0.3}
+    cache_key = make_cache_key("openai", model, params, content)
+    cached = cache_get(cache_key)
+    if cached is not None and (should_cache is None or should_cache(cached)):
+        record_cache_hit("openai", model, content)(cached)
+        yield cached
+        return
+
+    openai.api_key = api_key
+
+    prompt_tokens = count_tokens(content, model)
+
+    request = {"model": model, "messages": [{"role": "user", "content": content}], "stream": True, **params}
+
+    deadline = CALL_DEADLINE if deadline is None else deadline
+    start = time.monotonic()
+
+    def start_stream():
+        acquire("openai", prompt_tokens + params["max_tokens"])
+        request_timeout = remaining_time(start, deadline)
+        return replayable_call(
+            "openai", request, lambda: openai.ChatCompletion.create(**request, request_timeout=request_timeout)
+        )
+
+    attempt, attempts = count_attempts(start_stream)
+    try:
+        stream = call_with_retries(
+            attempt, openai_retryable_errors(),
+            max_attempts=retries, deadline=deadline, label=f"OpenAI {model} (stream)"
+        )
+    except InvalidRequestError:
+        record_call("openai", model, prompt_tokens, latency=time.monotonic() - start,
+                    retries=attempts["count"] - 1, ok=False)
+        # Let the regular path handle the fallback model
+        response = request_gpt_completion(api_key, content, retries, deadline, max_tokens, model)
+        if response:
+            yield response
+        return
+    except Exception as e:
+        record_call("openai", model, prompt_tokens, latency=time.monotonic() - start,
+                    retries=attempts["count"] - 1, ok=False)
+        print(f"[Unknown OpenAI API error] {e}")
+        return
+
+    parts = []
+    try:
+        for chunk in stream:
+            delta = chunk["choices"][0].get("delta", {}).get("content")
+            if delta:
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        record_call("openai", model, prompt_tokens, count_tokens("".join(parts), model),
+                    time.monotonic() - start, attempts["count"] - 1, ok=False)
+        print(f"[WARNING] OpenAI stream interrupted: {e}")
+        return
+
+    record_call("openai", model, prompt_tokens, count_tokens("".join(parts), model),
+                time.monotonic() - start, attempts["count"] - 1)
+    # Only complete (and, with should_cache, valid) responses go into the cache
+    response = "".join(parts).strip()
+    if should_cache is None or should_cache(response):
+        cache_put(cache_key, response, {"provider": "openai", "model": model, "params": params})
 
 def is_similar(slide_title, image_filename, threshold=70):
     clean_title = slide_title.lower().replace("_", " ")
     clean_filename = image_filename.lower().replace("_", " ")
     return fuzz.partial_ratio(clean_title, clean_filename) >= threshold
 
-def extract_document_data(doc_path):
+def parse_document(doc_path):
+    if DOCUMENT_BACKEND != "llamaparse" and doc_path.lower().endswith(".docx"):
+        start = time.monotonic()
+        try:
+            result = extract_docx(doc_path)
+            print(f"[INFO] Parsed {os.path.basename(doc_path)} locally in {time.monotonic() - start:.2f}s ({len(result.pages)} pages).")
+            return result
+        except Exception as e:
+            if DOCUMENT_BACKEND == "local":
+                raise
+            print(f"[WARNING] Local docx parsing failed ({e}), falling back to LlamaParse.")
+
+    options = {"language": "en"}
+
+    def run_llamaparse():
+        # Only reached on a parse cache miss, so cached reruns need no key
+        if not LLAMA_CLOUD_API_KEY and not is_replaying():
+            raise ValueError("LLAMA_CLOUD_API_KEY must be set in the environment.")
+        return replayable_parse(
+            doc_path, options,
+            lambda: LlamaParse(api_key=LLAMA_CLOUD_API_KEY, language="en", verbose=True).parse(doc_path)
+        )
+
+    start = time.monotonic()
+    result, cache_hit = cached_parse(doc_path, options, run_llamaparse)
+    record_call("llamaparse", "llamaparse", latency=time.monotonic() - start, pages=len(result.pages), cache_hit=cache_hit)
+    return result
+
+@llm_stage("parse")
+def extract_document_data(doc_path, images_dir=None):
     from markdownify import markdownify as md
     import textwrap
 
-    parser = LlamaParse(api_key=LLAMA_CLOUD_API_KEY, language="en", verbose=True)
-    result = parser.parse(doc_path)
+    result = parse_document(doc_path)
 
     text_documents = result.get_text_documents(split_by_page=False)
     text = "\n".join(doc.text for doc in text_documents)
+    page_spans = locate_pages(text, [page.text for page in result.pages])
 
-    images_dir = os.path.join(base_dir, "images")
+    images_dir = images_dir or os.path.join(base_dir, "images")
     if os.path.exists(images_dir):
         for f in os.listdir(images_dir):
             file_path = os.path.join(images_dir, f)
@@ -112,106 +458,47 @@ def extract_document_data(doc_path):
         images = []
 
     image_paths = []
-    from PIL import Image
-
-    solid_color_skips = 0
-    white_image_skips = 0
-
-    for idx, image_doc in enumerate(images):
-        print("[DEBUG] Processing image:", idx)
-        image_path = image_doc.image_path
-
-        # Skip blank images by checking if they are mostly white
-        try:
-            with Image.open(image_path) as img:
-                img_rgb = img.convert("RGB")
-                colors = img_rgb.getcolors(maxcolors=1000000)
-                if colors:
-                    dominant_ratio = max([count for count, _ in colors]) / (img.size[0] * img.size[1])
-                    if dominant_ratio > 0.98:
-                        print(f"[DEBUG] Skipping solid-color image {image_path} (dominant_ratio={dominant_ratio:.2f})")
-                        solid_color_skips += 1
-                        continue
-
-                img = img.convert("L")  # grayscale
-                pixels = list(img.getdata())
-                white_ratio = sum(1 for p in pixels if p > 245) / len(pixels)
-                if white_ratio > 0.98:
-                    print(f"[DEBUG] Skipping blank white image {image_path} (white_ratio={white_ratio:.2f})")
-                    white_image_skips += 1
-                    continue
-                    # print(f"[DEBUG] Skipping blank image {image_path} (white_ratio={white_ratio:.2f})")
-                    # continue
-        except Exception as e:
-            print(f"[WARNING] Could not process image {image_path}: {e}")
-        page_index = getattr(image_doc, 'page_index', idx)
-        context_text = getattr(image_doc, 'context_text', '') or ''
-        figure_label = None
-        caption = ''
-
-        # Step 2: If no LLM context, check for captions above/below
-        if not context_text and page_index < len(result.pages):
-            page_lines = result.pages[page_index].text.split('\n')
-            for i, line in enumerate(page_lines):
-                if 'fig' in line.lower():
-                    context_text = line.strip()
-                    break
-            if not context_text:
-                # Step 3: Check line just above image (assume image at bottom half of page)
-                for line in reversed(page_lines):
-                    if line.strip():
-                        context_text = line.strip()
-                        break
-        if not context_text and page_index > 0:
-            # Step 4: Fallback - get last line from previous page
-            prev_lines = result.pages[page_index - 1].text.split('\n')
-            for line in reversed(prev_lines):
-                if line.strip():
-                    context_text = line.strip()
-                    break
-
-        print(f"[DEBUG] context_text: {context_text}")
-        
-        # Try to find figure label
-        figure_label = None
-        match = re.search(r'(fig(?:ure)?\.?\s*\d+)', context_text, re.IGNORECASE)
-        if match:
-            figure_label = match.group(1).replace(" ", "_").upper()
-        print(f"[DEBUG] Extracted figure_label: {figure_label}")
-
-        # Try to extract nearby caption: 1–2 sentences max
-        caption_match = re.search(r'fig(?:ure)?\.?\s*\d+\.\s*(.*)', context_text, re.IGNORECASE)
-        caption = caption_match.group(1).strip() if caption_match else ''
-        print(f"[DEBUG] Extracted caption: {caption}")
-
-        parts = []
-        if figure_label:
-            parts.append(figure_label)
-        if caption:
-            parts.append('_'.join(caption.split()[:6]))  # first 6 words only
-
-        base_name = "_".join(parts) if parts else "image"
-        base_name = re.sub(r'\W+', '_', base_name)  # sanitize
-
-        new_filename = f"img_p{page_index}_{idx}_{base_name}.png"
-        new_path = os.path.join(images_dir, new_filename)
-
-        try:
-            os.rename(image_path, new_path)
-            image_paths.append(new_path)
-            print(f"[DEBUG] Renamed image to: {new_filename}")
-        except Exception as e:
-            print(f"[WARNING] Failed to rename image {image_path}: {e}")
+    image_spans = {}
+
+    start = time.monotonic()
+    image_results = process_images(images, [page.text for page in result.pages], images_dir)
+    kept_images = [image for image in image_results if image["status"] == "kept"]
+    # Repeated logos and banners collapse to their first occurrence
+    image_sources = dedup_images(kept_images)
+    duplicate_count = remove_duplicates(image_sources)
+    for image in kept_images:
+        if image["path"] not in image_sources:
+            continue
+        image_paths.append(image["path"])
+        # The local docx backend knows where each image sits in the text
+        offset = image["text_offset"]
+        image_spans[image["path"]] = [offset, offset] if offset is not None else anchor_span(
+            text, page_spans, image["page_index"], image["context_text"]
+        )
 
     print(f"[DEBUG] Number of images extracted: {len(image_paths)}")
-    print(f"[DEBUG] Number of solid-color images skipped: {solid_color_skips}")
-    print(f"[DEBUG] Number of white-space images skipped: {white_image_skips}")
+    print(f"[DEBUG] Number of duplicate images collapsed: {duplicate_count}")
+    print(f"[DEBUG] Number of solid-color images skipped: {sum(1 for image in image_results if image['status'] == 'solid')}")
+    print(f"[DEBUG] Number of white-space images skipped: {sum(1 for image in image_results if image['status'] == 'white')}")
+    print(
+        f"[DEBUG] Image processing took {time.monotonic() - start:.2f}s for {len(images)} images "
+        f"({sum(image['seconds'] for image in image_results):.2f}s filtering)"
+    )
 
     tables = []
-    for page in result.pages:
+    table_spans = []
+    for page_index, page in enumerate(result.pages):
         if hasattr(page, "structuredData") and page.structuredData:
             if "tables" in page.structuredData:
                 tables.extend(page.structuredData["tables"])
+                offsets = page.structuredData.get("table_offsets")
+                if offsets:
+                    table_spans.extend([offset, offset] for offset in offsets)
+                else:
+                    table_spans.extend(
+                        anchor_span(text, page_spans, page_index, table_snippet(table))
+                        for table in page.structuredData["tables"]
+                    )
 
     print(f"[DEBUG] Number of tables extracted: {len(tables)}")
 
@@ -229,7 +516,8 @@ def extract_document_data(doc_path):
             Document:
             {text}
         """)
-        markdown_response = make_api_call_gpt(os.getenv("OPENAI_API_KEY"), markdown_prompt)
+        with llm_stage("tables"):
+            markdown_response = make_api_call_gpt(os.getenv("OPENAI_API_KEY"), markdown_prompt)
         if markdown_response:
             guessed_tables = []
             for table_md in markdown_response.strip().split("\n\n"):
@@ -237,24 +525,24 @@ def extract_document_data(doc_path):
                     rows = [r.strip().strip('|').split('|') for r in table_md.strip().splitlines() if '|' in r]
                     guessed_tables.append([[cell.strip() for cell in row] for row in rows])
             tables.extend(guessed_tables)
-
             # Remove table content from text to avoid duplicate bullet slides
-            for table in guessed_tables:
-                for row in table:
-                    for cell in row:
-                        if cell.strip() and cell.strip() in text:
-                            text = text.replace(cell.strip(), "")
+            table_cuts = find_table_spans(text, guessed_tables)
+            # Anchor each table inside the rows being cut, not at the first prose mention of its header
+            table_spans.extend(locate_in_spans(text, table_snippet(table), table_cuts) for table in guessed_tables)
+            print(f"[DEBUG] Removing {len(table_cuts)} table spans ({sum(end - start for start, end in table_cuts)} chars) from text")
+            text = cut_tracking_spans(text, table_cuts, list(image_spans.values()) + table_spans)
 
-    return {"text": text, "images": image_paths, "tables": tables}
+    asset_positions = build_asset_positions(text, image_spans, table_spans)
+    return {
+        "text": text, "images": image_paths, "tables": tables, "asset_positions": asset_positions,
+        "image_sources": image_sources
+    }
 
 
-def extract_topics_from_gpt(document_text):
-    prompt = EXTRACT_TOPICS_MARKERS_TEMPLATE.replace("{{content}}", document_text)
-    response = make_api_call_gpt(os.getenv("OPENAI_API_KEY"), prompt)
-
-    if response is None:
-        raise ValueError("GPT topic extraction failed.")
+def build_topics_prompt(document_text):
+    return EXTRACT_TOPICS_MARKERS_TEMPLATE.replace("{{content}}", document_text)
 
+def parse_topics_response(response):
     topics = []
     lines = response.strip().split("\n")
     for i in range(0, len(lines), 2):
@@ -265,7 +553,23 @@ def extract_topics_from_gpt(document_text):
                 topics.append({"topic": topic, "sample_text": sample_text})
     return topics
 
-def split_text_into_chunks(text, max_words=1500):
+def plan_topics_max_tokens(prompt):
+    return min(TOPICS_MAX_TOKENS, plan_max_tokens(prompt, route_model("topics", prompt)))
+
+@llm_stage("topics")
+def extract_topics_from_gpt(document_text):
+    prompt = build_topics_prompt(document_text)
+    response = make_api_call_gpt(os.getenv("OPENAI_API_KEY"), prompt, max_tokens=plan_topics_max_tokens(prompt))
+
+    if response is None:
+        raise ValueError("GPT topic extraction failed.")
+
+    return parse_topics_response(response)
+
+def split_text_into_chunks(text, max_words=1500, max_tokens=None):
+    if max_tokens:
+        return split_text_by_tokens(text, max_tokens, "gpt-4")
+
     words = text.split()
     chunks = []
     for i in range(0, len(words), max_words):
@@ -273,49 +577,217 @@ def split_text_into_chunks(text, max_words=1500):
         chunks.append(chunk)
     return chunks
 
-def refine_gpt_slide_output(slides):
-    refine_prompt = SLIDE_REFINEMENT_PROMPT.replace("{original_slide_json}", json.dumps(slides, indent=2))
-    refined_response = make_api_call_gpt(os.getenv("OPENAI_API_KEY"), refine_prompt)
-    if refined_response:
-        try:
-            print("[INFO] Using refined response instead of original slides.")
-            return json.loads(refined_response)
-        except json.JSONDecodeError:
-            print("[WARNING] Refined response is not valid JSON. Using original slides.")
-            return slides
+def build_refine_prompts(slides, indices):
+    # One prompt per overlapping window of the selected slides, each with a
+    # summary of everything before it in the deck
+    selected = [slides[i] for i in indices]
+    windows = plan_refine_windows(len(selected))
+    prompts = [
+        SLIDE_WINDOW_REFINEMENT_PROMPT.format(
+            slide_count=end - start,
+            deck_summary=summarize_slides(slides[:indices[start]]),
+            original_slide_json=json.dumps(selected[start:end], indent=2)
+        )
+        for start, end, _ in windows
+    ]
+    return selected, windows, prompts
+
+def parse_refined_window(refined_response, window_idx, slide_count):
+    if not refined_response:
+        print(f"[WARNING] No refined response for window {window_idx+1}. Using original slides.")
+        return None
+    slides, complete = parse_slide_array(refined_response)
+    if complete:
+        return slides
+    if not slides:
+        print(f"[WARNING] Refined response for window {window_idx+1} is not valid JSON. Using original slides.")
+        return None
+    # Truncated: keep the refined slides that made it, the rest stay as they were
+    print(f"[WARNING] Refined response for window {window_idx+1} was cut off after {len(slides)} slides.")
+    return slides + [None] * max(0, slide_count - len(slides))
+
+def merge_refined_responses(slides, indices, windows, responses):
+    results = [
+        parse_refined_window(response, w, end - start)
+        for w, ((start, end, _), response) in enumerate(zip(windows, responses))
+    ]
+    print(f"[INFO] Refined {sum(1 for r in results if r is not None)}/{len(windows)} slide windows.")
+    merged = list(slides)
+    for idx, slide in zip(indices, merge_refined_windows([slides[i] for i in indices], windows, results)):
+        merged[idx] = slide
+    return merged
+
+def plan_refine_max_tokens(prompt, window_slides):
+    # A refined window is about as long as the original one
+    model = route_model("refinement", prompt)
+    expected_tokens = max(len(window_slides) * TOKENS_PER_SLIDE, count_tokens(json.dumps(window_slides), model))
+    return plan_max_tokens(prompt, model, expected_tokens + RESPONSE_OVERHEAD)
+
+@llm_stage("refinement")
+def refine_gpt_slide_output(slides, max_workers=None):
+    # Slides that already pass the local quality checks skip the round-trip
+    indices = slides_needing_refinement(slides)
+    if not indices:
+        print(f"[INFO] All {len(slides)} slides pass the quality checks; skipping refinement.")
+        return slides
+    print(f"[INFO] Refining {len(indices)}/{len(slides)} slides.")
+
+    selected, windows, prompts = build_refine_prompts(slides, indices)
+    max_workers = REFINE_MAX_WORKERS if max_workers is None else max_workers
+
+    def refine_window(i):
+        start, end, _ = windows[i]
+        return make_api_call_llm(
+            prompts[i], max_tokens=plan_refine_max_tokens(prompts[i], selected[start:end]),
+            validate=is_slide_json, should_cache=is_slide_json
+        )
+
+    # Windows are independent; results are merged by window index, not completion order
+    if max_workers > 1 and len(windows) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(windows))) as executor:
+            responses = list(executor.map(bind_stage(refine_window), range(len(windows))))
     else:
-        print("[WARNING] No refined slide response from GPT. Using original slides.")
+        responses = [refine_window(i) for i in range(len(windows))]
+    return merge_refined_responses(slides, indices, windows, responses)
+
+def segment_assets(segment, document_data):
+    # The images and tables placed in or near this segment
+    word_offset = document_data.get('word_offset', 0) + segment.get('word_start', 0)
+    return scope_assets(document_data, word_offset, word_offset + len(segment['content'].split()))
+
+def build_enrich_prompt(segment, document_data):
+    # Only the images and tables placed in or near this segment go into the prompt
+    images, tables = segment_assets(segment, document_data)
+    return ENRICH_PRESENTATION_PROMPT.format(
+        text_content=segment['content'],
+        image_paths=images,
+        table_data=json.dumps(tables, indent=2)
+    )
+
+def log_segment_assets(idx, segment, document_data):
+    images, tables = segment_assets(segment, document_data)
+    print(f"[DEBUG] Table data sent to GPT for chunk {idx+1}: {json.dumps(tables, indent=2)}")
+    print(f"[DEBUG] Image data sent to GPT for chunk {idx+1}: {json.dumps(images, indent=2)}")
+
+def expected_enrich_tokens(segment, document_data, model="gpt-4"):
+    return expected_output_tokens(segment['content'], model, segment_assets(segment, document_data)[1])
+
+def plan_enrich_max_tokens(prompt, segment, document_data):
+    model = route_model("enrichment", prompt)
+    return plan_max_tokens(prompt, model, expected_enrich_tokens(segment, document_data, model))
+
+def stream_segment_slides(idx, total, segment, document_data):
+    partial_prompt = build_enrich_prompt(segment, document_data)
+    log_segment_assets(idx, segment, document_data)
+    print(f"[INFO] Streaming topic chunk {idx+1}/{total} from GPT...")
+    return iter_slide_objects(stream_api_call_gpt(
+        os.getenv("OPENAI_API_KEY"), partial_prompt, max_tokens=plan_enrich_max_tokens(partial_prompt, segment, document_data),
+        should_cache=is_slide_json
+    ))
+
+@llm_stage("enrichment")
+def enrich_segment_with_gpt(idx, total, segment, document_data, stream=False, on_slide=None):
+    if stream:
+        slides = []
+        for slide in stream_segment_slides(idx, total, segment, document_data):
+            slides.append(slide)
+            if on_slide:
+                on_slide(idx, slide)
+        if slides:
+            print(f"[DEBUG] Streamed {len(slides)} slides for chunk {idx+1}.")
+        else:
+            print(f"[WARNING] No slides streamed for topic chunk {idx+1}, skipping.")
         return slides
 
-def enrich_with_gpt(document_data, topics):
-    print(f"[DEBUG] Table data sent to GPT: {json.dumps(document_data['tables'], indent=2)}")
-    print(f"[DEBUG] Image data sent to GPT: {json.dumps(document_data['images'], indent=2)}")
+    partial_prompt = build_enrich_prompt(segment, document_data)
+    log_segment_assets(idx, segment, document_data)
+    print(f"[INFO] Sending topic chunk {idx+1}/{total} to GPT...")
+    # A truncated array counts as an answer (not a reason to hedge): its tail is re-requested below
+    response = make_api_call_llm(
+        partial_prompt, max_tokens=plan_enrich_max_tokens(partial_prompt, segment, document_data),
+        validate=has_slides, should_cache=is_slide_json
+    )
+    slides, complete = parse_slide_array(response)
+
+    # A truncated array keeps its complete slides; only the missing tail is asked for again
+    for _ in range(ENRICH_TAIL_RETRIES):
+        if complete or not slides:
+            break
+        print(f"[INFO] Topic chunk {idx+1} was cut off after {len(slides)} slides, requesting the rest...")
+        tail_prompt = build_continuation_prompt(partial_prompt, slides)
+        tail, complete = parse_slide_array(make_api_call_llm(
+            tail_prompt, max_tokens=plan_enrich_max_tokens(tail_prompt, segment, document_data),
+            validate=has_slides, should_cache=is_slide_json
+        ))
+        slides.extend(tail)
+        if not tail:
+            break
+
+    return report_enriched_slides(idx, response, slides, complete)
+
+def build_continuation_prompt(original_prompt, slides):
+    titles = "\n".join(f"{i+1}. {slide.get('title', '')}" for i, slide in enumerate(slides))
+    return SLIDE_CONTINUATION_PROMPT.format(original_prompt=original_prompt.strip(), generated_titles=titles)
+
+def report_enriched_slides(idx, response, slides, complete):
+    if not response:
+        print(f"[WARNING] No response for topic chunk {idx+1}, skipping.")
+    elif not slides and not complete:
+        print(f"[WARNING] Topic chunk {idx+1} returned invalid JSON and was skipped.")
+    elif complete:
+        print(f"[DEBUG] GPT response parsed successfully for chunk {idx+1}.")
+    else:
+        print(f"[WARNING] Topic chunk {idx+1} is incomplete; keeping the {len(slides)} slides recovered.")
+    return slides
+
+def parse_enriched_response(idx, response):
+    slides, complete = parse_slide_array(response)
+    return report_enriched_slides(idx, response, slides, complete)
 
+def build_topic_segments(document_data, topics):
     segments = []
     for i in range(len(topics)):
         start = document_data['text'].find(topics[i]['sample_text'])
         end = document_data['text'].find(topics[i + 1]['sample_text']) if i + 1 < len(topics) else len(document_data['text'])
         if start != -1:
-            segments.append({"topic": topics[i]['topic'], "content": document_data['text'][start:end]})
+            segments.append({
+                "topic": topics[i]['topic'],
+                "content": document_data['text'][start:end],
+                "word_start": len(document_data['text'][:start].split())
+            })
+    return segments
+
+def enrich_with_gpt(document_data, topics, max_workers=None, stream=None, on_slide=None):
+    segments = fit_segments(
+        build_topic_segments(document_data, topics),
+        lambda segment: build_enrich_prompt(segment, document_data),
+        "gpt-4",
+        lambda segment: expected_enrich_tokens(segment, document_data)
+    )
+
+    if max_workers is None:
+        max_workers = ENRICH_MAX_WORKERS
+    if stream is None:
+        stream = ENRICH_STREAM
+
+    # Segments are independent, so fan them out and keep the results in document order.
+    # In streaming mode on_slide(segment_index, slide) fires as soon as each slide object closes.
+    if max_workers > 1 and len(segments) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(segments))) as executor:
+            futures = [
+                executor.submit(enrich_segment_with_gpt, idx, len(segments), segment, document_data, stream, on_slide)
+                for idx, segment in enumerate(segments)
+            ]
+            results = [future.result() for future in futures]
+    else:
+        results = [
+            enrich_segment_with_gpt(idx, len(segments), segment, document_data, stream, on_slide)
+            for idx, segment in enumerate(segments)
+        ]
 
     structured_response = []
-
-    for idx, segment in enumerate(segments):
-        partial_prompt = ENRICH_PRESENTATION_PROMPT.format(
-            text_content=segment['content'],
-            image_paths=document_data['images'],
-            table_data=json.dumps(document_data['tables'], indent=2)
-        )
-        print(f"[INFO] Sending topic chunk {idx+1}/{len(segments)} to GPT...")
-        response = make_api_call_gpt(os.getenv("OPENAI_API_KEY"), partial_prompt)
-        if response:
-            try:
-                structured_response.extend(json.loads(response))
-                print(f"[DEBUG] GPT response parsed successfully for chunk {idx+1}.")
-            except json.JSONDecodeError:
-                print(f"[WARNING] Topic chunk {idx+1} returned invalid JSON and was skipped.")
-        else:
-            print(f"[WARNING] No response for topic chunk {idx+1}, skipping.")
+    for slides in results:
+        structured_response.extend(slides)
 
     if not structured_response:
         print("[ERROR] GPT API returned no usable data. Please check the prompt or API response logs above.")
@@ -492,11 +964,14 @@ def create_ppt_from_gpt(gpt_slides, document_data, ppt_path="generated_deck.pptx
     ppt.save(ppt_path)
     print(f"Presentation saved as {ppt_path}")
 
+@llm_stage("captions")
 def generate_image_captions(image_paths):
     import openai
     openai.api_key = os.getenv("OPENAI_API_KEY")
 
     captions = {}
+    caption_prompt = "Describe this image in 2-3 sentences focusing on objects and key ideas."
+    caption_model = route_model("captions", caption_prompt)
 
     for idx, image_path in enumerate(image_paths):
         print(f"[INFO] Captioning image {idx+1}/{len(image_paths)}: {image_path}")
@@ -504,24 +979,40 @@ def generate_image_captions(image_paths):
 
         try:
             with open(image_path, "rb") as image_file:
-                image_data = base64.b64encode(image_file.read()).decode("utf-8")
+                image_bytes = image_file.read()
+            image_data = base64.b64encode(image_bytes).decode("utf-8")
 
             data_url = f"data:{mime_type};base64,{image_data}"
 
-            response = openai.ChatCompletion.create(
-                model="gpt-4-turbo",
-                messages=[
+            def request_caption():
+                # Vision input is billed per image tile; budget roughly one high-detail image
+                response = tracked_chat_completion(
+                    caption_model,
+                    count_tokens(caption_prompt, caption_model) + 765,
                     {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": "Describe this image in 2-3 sentences focusing on objects and key ideas."},
-                            {"type": "image_url", "image_url": {"url": data_url}}
-                        ]
+                        "messages": [
+                            {
+                                "role": "user",
+                                "content": [
+                                    {"type": "text", "text": caption_prompt},
+                                    {"type": "image_url", "image_url": {"url": data_url}}
+                                ]
+                            }
+                        ],
+                        "max_tokens": 300
                     }
-                ],
-                max_tokens=300
+                )
+                return response['choices'][0]['message']['content']
+
+            # Key the cache on the image bytes rather than the (large) data URL
+            caption_key_text = caption_prompt + "\n" + hash_text(image_bytes)
+            caption = single_flight(
+                make_cache_key("openai", caption_model, {"max_tokens": 300}, caption_key_text),
+                lambda: cached_call(
+                    "openai", caption_model, {"max_tokens": 300}, caption_key_text, request_caption,
+                    on_hit=record_cache_hit("openai", caption_model, caption_prompt)
+                )
             )
-            caption = response['choices'][0]['message']['content']
             # print(f"[INFO] Caption for {image_path}: {caption}")
             captions[image_path] = caption
             print(f"[DEBUG] Caption: {caption}")
@@ -529,10 +1020,6 @@ def generate_image_captions(image_paths):
         except Exception as e:
             print(f"[WARNING] Failed to caption image {image_path}: {e}")
 
-        wait_time = random.uniform(1, 2)
-        print(f"[INFO] Sleeping {wait_time:.1f}s before next image...")
-        time.sleep(wait_time)
-
     return captions
 
 def map_images_to_slides(slides, image_captions):
@@ -573,7 +1060,9 @@ def main():
         json.dump(image_captions, f, ensure_ascii=False, indent=4)
 
     # CHUNKING TEXT
-    text_chunks = split_text_into_chunks(document_data['text'], max_words=2500)
+    text_chunks = split_text_into_chunks(document_data['text'], max_tokens=CHUNK_MAX_TOKENS)
+
+    chunk_offsets = chunk_word_offsets(text_chunks)
 
     all_gpt_responses = []
     for idx, chunk_text in enumerate(text_chunks):
@@ -582,7 +1071,9 @@ def main():
         temp_doc_data = {
             'text': chunk_text,
             'images': document_data['images'],
-            'tables': document_data['tables']
+            'tables': document_data['tables'],
+            'asset_positions': document_data.get('asset_positions'),
+            'word_offset': chunk_offsets[idx]
         }
 
         try:
@@ -596,10 +1087,6 @@ def main():
         except ValueError as e:
             print(f"[ERROR] Skipping chunk {idx+1} due to topic extraction failure: {e}")
 
-        wait_time = random.uniform(4, 7)
-        print(f"[INFO] Sleeping {wait_time:.1f}s before next chunk...")
-        time.sleep(wait_time)
-
     with open(os.path.join(intermediate_dir, "gpt_structured_response.json"), "w", encoding="utf-8") as json_file:
         json.dump(all_gpt_responses, json_file, ensure_ascii=False, indent=4)
 
@@ -608,6 +1095,139 @@ def main():
     print(f"[INFO] Slide to Image Mapping: {slide_to_image_mapping}")
 
     create_ppt_from_gpt(all_gpt_responses, document_data, output_ppt_path, template_path)
+    print_cache_stats()
+    print_limiter_stats()
+    print_flight_stats()
+    print_hedge_stats()
+    print_breaker_states()
+    print_telemetry_summary()
+    print_replay_stats()
+
+def batch_route(stage, prompts):
+    # A batch goes to one model, so route it by its largest prompt
+    return route_model(stage, max(prompts.values(), key=len, default=""))
+
+def main_batch(doc_paths, output_dir=None):
+    api_key = os.getenv("OPENAI_API_KEY")
+    output_dir = output_dir or os.path.join(base_dir, "output")
+    template_path = os.path.join(base_dir, "template", "template.pptx")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Image captions only feed the (logged) slide-to-image mapping, so batch mode skips them
+    documents = []
+    for doc_path in doc_paths:
+        name = os.path.splitext(os.path.basename(doc_path))[0]
+        document_data = extract_document_data(doc_path, images_dir=os.path.join(base_dir, "images", name))
+        with open(os.path.join(intermediate_dir, f"{name}_extracted_data.json"), "w", encoding="utf-8") as json_file:
+            json.dump(document_data, json_file, ensure_ascii=False, indent=4)
+        chunks = split_text_into_chunks(document_data['text'], max_tokens=CHUNK_MAX_TOKENS)
+        documents.append({"name": name, "data": document_data, "chunks": chunks})
+
+    def chunk_data(doc, c):
+        return {
+            'text': doc["chunks"][c],
+            'images': doc["data"]['images'],
+            'tables': doc["data"]['tables'],
+            'asset_positions': doc["data"].get('asset_positions'),
+            'word_offset': chunk_word_offsets(doc["chunks"])[c]
+        }
+
+    # Stage 1: topic markers for every chunk of every document
+    topic_prompts = {}
+    topic_tokens = {}
+    for d, doc in enumerate(documents):
+        for c, chunk_text in enumerate(doc["chunks"]):
+            key = f"d{d}-c{c}-topics"
+            topic_prompts[key] = build_topics_prompt(chunk_text)
+            topic_tokens[key] = plan_topics_max_tokens(topic_prompts[key])
+    with llm_stage("topics"):
+        topic_responses = run_chat_batch(
+            api_key, topic_prompts, model=batch_route("topics", topic_prompts),
+            max_tokens=topic_tokens, label="Topic extraction"
+        )
+
+    # Stage 2: one enrichment request per topic segment
+    enrich_prompts = {}
+    enrich_tokens = {}
+    chunk_segments = {}
+    for d, doc in enumerate(documents):
+        for c, chunk_text in enumerate(doc["chunks"]):
+            response = topic_responses.get(f"d{d}-c{c}-topics")
+            if response is None:
+                print(f"[ERROR] Skipping chunk {c+1} of {doc['name']} due to topic extraction failure.")
+                continue
+            data = chunk_data(doc, c)
+            segments = fit_segments(
+                build_topic_segments(data, parse_topics_response(response)),
+                lambda segment: build_enrich_prompt(segment, data),
+                "gpt-4",
+                lambda segment: expected_enrich_tokens(segment, data)
+            )
+            chunk_segments[(d, c)] = len(segments)
+            for s, segment in enumerate(segments):
+                key = f"d{d}-c{c}-s{s}"
+                enrich_prompts[key] = build_enrich_prompt(segment, data)
+                enrich_tokens[key] = plan_enrich_max_tokens(enrich_prompts[key], segment, data)
+    with llm_stage("enrichment"):
+        enrich_responses = run_chat_batch(
+            api_key, enrich_prompts, model=batch_route("enrichment", enrich_prompts),
+            max_tokens=enrich_tokens, label="Enrichment",
+            should_cache=is_slide_json
+        )
+
+    # Stage 3: one refinement request per window of slides failing the quality checks
+    chunk_slides = {}
+    chunk_windows = {}
+    refine_prompts = {}
+    refine_tokens = {}
+    for (d, c), segment_count in chunk_segments.items():
+        slides = []
+        for s in range(segment_count):
+            slides.extend(parse_enriched_response(s, enrich_responses.get(f"d{d}-c{c}-s{s}")))
+        if slides:
+            chunk_slides[(d, c)] = slides
+            indices = slides_needing_refinement(slides)
+            if not indices:
+                continue
+            selected, windows, prompts = build_refine_prompts(slides, indices)
+            chunk_windows[(d, c)] = (indices, windows)
+            for w, (start, end, _) in enumerate(windows):
+                key = f"d{d}-c{c}-w{w}"
+                refine_prompts[key] = prompts[w]
+                refine_tokens[key] = plan_refine_max_tokens(prompts[w], selected[start:end])
+    with llm_stage("refinement"):
+        refine_responses = run_chat_batch(
+            api_key, refine_prompts, model=batch_route("refinement", refine_prompts),
+            max_tokens=refine_tokens, label="Refinement",
+            should_cache=is_slide_json
+        )
+
+    # Reassemble each deck in document order
+    for d, doc in enumerate(documents):
+        all_gpt_responses = []
+        for c in range(len(doc["chunks"])):
+            if (d, c) in chunk_windows:
+                indices, windows = chunk_windows[(d, c)]
+                all_gpt_responses.extend(merge_refined_responses(
+                    chunk_slides[(d, c)], indices, windows,
+                    [refine_responses.get(f"d{d}-c{c}-w{w}") for w in range(len(windows))]
+                ))
+            elif (d, c) in chunk_slides:
+                all_gpt_responses.extend(chunk_slides[(d, c)])
+
+        with open(os.path.join(intermediate_dir, f"{doc['name']}_gpt_structured_response.json"), "w", encoding="utf-8") as json_file:
+            json.dump(all_gpt_responses, json_file, ensure_ascii=False, indent=4)
+
+        output_ppt_path = os.path.join(output_dir, f"{doc['name']}_presentation.pptx")
+        create_ppt_from_gpt(all_gpt_responses, doc["data"], output_ppt_path, template_path)
+
+    print_cache_stats()
+    print_telemetry_summary()
+    print_replay_stats()
 
 if __name__ == "__main__":
-    main()
+    # python FinalCode.py --batch doc1.docx doc2.docx ...
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        main_batch(sys.argv[2:] or [os.path.join(base_dir, "input", "doc.docx")])
+    else:
+        main()
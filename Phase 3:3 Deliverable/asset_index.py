@@ -0,0 +1,176 @@
+# asset_index.py
+#
+# Position index for extracted images and tables. Every asset gets a span in
+# the document text, stored as word indices so it survives the whitespace
+# normalisation done by chunking. Each enrichment prompt then only carries the
+# assets that appear in or near its segment, instead of every table and image
+# in the document.
+
+import os
+import re
+from bisect import bisect_left, bisect_right
+
+ASSET_WINDOW_WORDS = int(os.getenv("ASSET_WINDOW_WORDS", "150"))
+
+WORD_PATTERN = re.compile(r'\S+')
+
+
+def locate_pages(text, page_texts):
+    # Find where each page's text starts in the joined document text; a page that
+    # can't be found gets None, so its assets stay unplaced instead of being pinned
+    # to a zero-width span, and the page before it runs on to the next page found
+    spans = []
+    cursor = 0
+    for page_text in page_texts:
+        snippet = " ".join((page_text or "").split())[:60]
+        start = -1
+        if snippet:
+            first_word = snippet.split()[0]
+            candidate = text.find(first_word, cursor)
+            while candidate != -1:
+                if " ".join(text[candidate:candidate + len(snippet) * 2].split()).startswith(snippet):
+                    start = candidate
+                    break
+                candidate = text.find(first_word, candidate + 1)
+        if start == -1:
+            spans.append(None)
+            continue
+        spans.append([start, start])
+        cursor = start
+
+    end = len(text)
+    for span in reversed(spans):
+        if span is not None:
+            span[1] = end
+            end = span[0]
+    return spans
+
+
+def locate_snippet(text, snippet, start=0, end=None):
+    snippet = (snippet or "").strip()
+    if not snippet:
+        return None
+    end = len(text) if end is None else end
+    position = text.find(snippet, start, end)
+    if position == -1:
+        return None
+    return [position, position + len(snippet)]
+
+
+def anchor_span(text, page_spans, page_index, snippet):
+    # Precise span of the snippet on its page if we can find it, else the page itself
+    page_span = page_spans[page_index] if page_index is not None and 0 <= page_index < len(page_spans) else None
+    if page_span:
+        span = locate_snippet(text, snippet, page_span[0], page_span[1])
+        return span or list(page_span)
+    return locate_snippet(text, snippet)
+
+
+def locate_in_spans(text, snippet, spans):
+    # First occurrence of the snippet inside one of the given regions, or None
+    for start, end in spans:
+        span = locate_snippet(text, snippet, start, end)
+        if span:
+            return span
+    return None
+
+
+def table_snippet(table):
+    for row in table or []:
+        if isinstance(row, (list, tuple)):
+            for cell in row:
+                if str(cell).strip():
+                    return str(cell).strip()
+        elif isinstance(row, dict):
+            for value in row.values():
+                if str(value).strip():
+                    return str(value).strip()
+    return ""
+
+
+def cut_tracking_spans(text, cuts, spans):
+    # Removes sorted, non-overlapping [start, end) cuts from text in one rebuild and
+    # shifts the given character spans; a position inside a cut moves to where it was
+    if not cuts:
+        return text
+    cut_starts = [cut[0] for cut in cuts]
+    removed_before = [0]
+    for start, end in cuts:
+        removed_before.append(removed_before[-1] + end - start)
+
+    def shift(position):
+        i = bisect_right(cut_starts, position) - 1
+        if i < 0:
+            return position
+        start, end = cuts[i]
+        return start - removed_before[i] if position < end else position - removed_before[i + 1]
+
+    for span in spans:
+        if span is None:
+            continue
+        for i in (0, 1):
+            span[i] = shift(span[i])
+
+    pieces = []
+    previous_end = 0
+    for start, end in cuts:
+        pieces.append(text[previous_end:start])
+        previous_end = end
+    pieces.append(text[previous_end:])
+    return "".join(pieces)
+
+
+def char_spans_to_word_spans(text, spans):
+    starts = [m.start() for m in WORD_PATTERN.finditer(text)]
+    word_spans = []
+    for span in spans:
+        if span is None:
+            word_spans.append(None)
+            continue
+        word_start = bisect_left(starts, span[0])
+        word_end = max(word_start, bisect_left(starts, span[1]))
+        word_spans.append([word_start, word_end])
+    return word_spans
+
+
+def build_asset_positions(text, image_spans, table_spans):
+    image_paths = list(image_spans.keys())
+    word_spans = char_spans_to_word_spans(text, [image_spans[path] for path in image_paths] + list(table_spans))
+    return {
+        "images": dict(zip(image_paths, word_spans[:len(image_paths)])),
+        "tables": word_spans[len(image_paths):],
+    }
+
+
+def chunk_word_offsets(chunks):
+    # Chunks are consecutive runs of the document's words
+    offsets = []
+    position = 0
+    for chunk in chunks:
+        offsets.append(position)
+        position += len(chunk.split())
+    return offsets
+
+
+def spans_overlap(span, start, end):
+    return span is not None and span[0] <= end and span[1] >= start
+
+
+def scope_assets(document_data, word_start, word_end, window=None):
+    window = ASSET_WINDOW_WORDS if window is None else window
+    positions = document_data.get("asset_positions")
+    if not positions:
+        return document_data["images"], document_data["tables"]
+
+    start = word_start - window
+    end = word_end + window
+    # Assets we could not place anywhere stay visible to every segment
+    images = [
+        path for path in document_data["images"]
+        if positions["images"].get(path) is None or spans_overlap(positions["images"][path], start, end)
+    ]
+    tables = [
+        table for i, table in enumerate(document_data["tables"])
+        if i >= len(positions["tables"]) or positions["tables"][i] is None or spans_overlap(positions["tables"][i], start, end)
+    ]
+    return images, tables
@@ -0,0 +1,184 @@
+# batch_client.py
+#
+# Minimal client for the OpenAI Batch API (files + batches endpoints), used for
+# overnight corpus runs where interactive latency doesn't matter. Prompts are
+# written to a JSONL file, submitted as one batch job, polled until the job
+# finishes, and the outputs are mapped back to their custom ids. Results go
+# through the LLM cache, so prompts answered before are never resubmitted.
+#
+# OPENAI_BATCH_BASE_URL can point at batch_standin.py for offline runs.
+
+import os
+import json
+import time
+import uuid
+import http.client
+import urllib.error
+import urllib.request
+
+from llm_cache import cache_get, cache_put, make_cache_key
+from retry_policy import call_with_retries
+from llm_telemetry import record_call
+from token_budget import count_tokens
+
+BATCH_API_BASE = os.getenv("OPENAI_BATCH_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+BATCH_POLL_INTERVAL = float(os.getenv("OPENAI_BATCH_POLL_INTERVAL", "30"))
+BATCH_TIMEOUT = float(os.getenv("OPENAI_BATCH_TIMEOUT", str(26 * 3600)))
+BATCH_COMPLETION_WINDOW = "24h"
+
+BATCH_FINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+def batch_api_request(api_key, method, path, body=None, content_type="application/json", base_url=None):
+    url = (base_url or BATCH_API_BASE) + path
+    headers = {"Authorization": f"Bearer {api_key}"}
+    if body is not None:
+        headers["Content-Type"] = content_type
+
+    def send():
+        req = urllib.request.Request(url, data=body, headers=headers, method=method)
+        with urllib.request.urlopen(req, timeout=120) as response:
+            return response.read()
+
+    return call_with_retries(
+        send, (urllib.error.URLError, http.client.HTTPException, OSError),
+        label=f"OpenAI batch {method} {path}"
+    )
+
+
+def upload_batch_file(api_key, jsonl_bytes, base_url=None):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="purpose"\r\n\r\n'
+        f"batch\r\n"
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="batch_input.jsonl"\r\n'
+        f"Content-Type: application/jsonl\r\n\r\n"
+    ).encode("utf-8") + jsonl_bytes + f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+    response = batch_api_request(
+        api_key, "POST", "/files", body,
+        content_type=f"multipart/form-data; boundary={boundary}", base_url=base_url
+    )
+    return json.loads(response)["id"]
+
+
+def create_batch(api_key, input_file_id, base_url=None):
+    body = json.dumps({
+        "input_file_id": input_file_id,
+        "endpoint": "/v1/chat/completions",
+        "completion_window": BATCH_COMPLETION_WINDOW,
+    }).encode("utf-8")
+    return json.loads(batch_api_request(api_key, "POST", "/batches", body, base_url=base_url))
+
+
+def get_batch(api_key, batch_id, base_url=None):
+    return json.loads(batch_api_request(api_key, "GET", f"/batches/{batch_id}", base_url=base_url))
+
+
+def download_file(api_key, file_id, base_url=None):
+    return batch_api_request(api_key, "GET", f"/files/{file_id}/content", base_url=base_url).decode("utf-8")
+
+
+def wait_for_batch(api_key, batch_id, poll_interval=None, timeout=None, base_url=None):
+    poll_interval = BATCH_POLL_INTERVAL if poll_interval is None else poll_interval
+    timeout = BATCH_TIMEOUT if timeout is None else timeout
+    start = time.monotonic()
+
+    while True:
+        batch = get_batch(api_key, batch_id, base_url=base_url)
+        counts = batch.get("request_counts") or {}
+        print(
+            f"[INFO] Batch {batch_id}: {batch.get('status')} "
+            f"({counts.get('completed', 0)}/{counts.get('total', '?')} done, {counts.get('failed', 0)} failed)"
+        )
+        if batch.get("status") in BATCH_FINAL_STATES:
+            return batch
+        if time.monotonic() - start > timeout:
+            print(f"[WARNING] Batch {batch_id} did not finish within {timeout:.0f}s.")
+            return batch
+        time.sleep(poll_interval)
+
+
+def run_chat_batch(api_key, prompts, model="gpt-4", max_tokens=4096, temperature=0.3,
+                   label="batch", poll_interval=None, timeout=None, base_url=None, should_cache=None):
+    # max_tokens may be a single value or a {custom_id: max_tokens} mapping; should_cache
+    # works as in llm_cache.cached_call, so truncated answers are neither cached nor replayed
+    def request_params(custom_id):
+        tokens = max_tokens[custom_id] if isinstance(max_tokens, dict) else max_tokens
+        return {"max_tokens": tokens, "temperature": temperature}
+
+    results = {}
+    pending = {}
+    for custom_id, prompt in prompts.items():
+        cached = cache_get(make_cache_key("openai", model, request_params(custom_id), prompt))
+        if cached is not None and (should_cache is None or should_cache(cached)):
+            results[custom_id] = cached
+            record_call("openai", model, count_tokens(prompt, model), count_tokens(cached, model), cache_hit=True)
+        else:
+            pending[custom_id] = prompt
+
+    print(f"[INFO] {label}: {len(results)} prompts answered from cache, {len(pending)} to submit.")
+    if not pending:
+        return results
+
+    lines = []
+    for custom_id, prompt in pending.items():
+        lines.append(json.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                **request_params(custom_id),
+            },
+        }, ensure_ascii=False))
+
+    start = time.monotonic()
+    file_id = upload_batch_file(api_key, "\n".join(lines).encode("utf-8"), base_url=base_url)
+    batch = create_batch(api_key, file_id, base_url=base_url)
+    print(f"[INFO] {label}: submitted batch {batch['id']} with {len(pending)} requests.")
+    batch = wait_for_batch(api_key, batch["id"], poll_interval, timeout, base_url=base_url)
+    # Every request in the batch waited for the whole job
+    latency = time.monotonic() - start
+
+    if batch.get("status") != "completed":
+        print(f"[WARNING] {label}: batch {batch['id']} ended with status {batch.get('status')}.")
+
+    # Expired or cancelled batches may still carry partial output
+    if batch.get("output_file_id"):
+        for line in download_file(api_key, batch["output_file_id"], base_url=base_url).splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = record.get("custom_id")
+            response = record.get("response") or {}
+            if custom_id not in pending or response.get("status_code") != 200:
+                continue
+            try:
+                text = response["body"]["choices"][0]["message"]["content"].strip()
+            except (KeyError, IndexError, TypeError, AttributeError):
+                continue
+            results[custom_id] = text
+            usage = response["body"].get("usage") or {}
+            record_call(
+                "openai", model, usage.get("prompt_tokens", count_tokens(pending[custom_id], model)),
+                usage.get("completion_tokens", count_tokens(text, model)), latency, batch=True
+            )
+            if should_cache is not None and not should_cache(text):
+                continue
+            params = request_params(custom_id)
+            cache_put(
+                make_cache_key("openai", model, params, pending[custom_id]), text,
+                {"provider": "openai", "model": model, "params": params}
+            )
+
+    missing = [custom_id for custom_id in pending if custom_id not in results]
+    if missing:
+        print(f"[WARNING] {label}: {len(missing)} requests returned no usable output: {missing[:5]}")
+        for custom_id in missing:
+            results[custom_id] = None
+            record_call("openai", model, count_tokens(pending[custom_id], model), latency=latency, ok=False, batch=True)
+    return results
@@ -0,0 +1,214 @@
+# batch_standin.py
+#
+# Local stand-in for the OpenAI files + batches endpoints, so batch mode can be
+# exercised without network access or API spend. Jobs complete after
+# `completion_delay` seconds; each request is answered by `responder(body)`,
+# which receives the chat completion request body and returns the reply text.
+# The default responder recognises the pipeline's three prompts and answers
+# each in the shape its parser expects: topic markers taken from the chunk,
+# slides built from the segment's sentences and tables, and refinement
+# windows echoed back unchanged.
+#
+#   python batch_standin.py 8765
+#   OPENAI_BATCH_BASE_URL=http://127.0.0.1:8765/v1 python FinalCode.py --batch input/doc.docx
+
+import re
+import sys
+import json
+import time
+import uuid
+import threading
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOPICS_MARKER = "Now extract from the document below:"
+ENRICH_MARKER = "Document text:\n"
+REFINE_MARKER = "original slide JSON"
+TOPIC_COUNT = 4
+BULLETS_PER_SLIDE = 4
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def between(text, start, end):
+    text = text.split(start, 1)[1]
+    return text.split(end, 1)[0]
+
+
+def answer_topics(prompt):
+    # Chunks are single-spaced, so the first ten words of each section are found again verbatim
+    text = " ".join(between(prompt.split(TOPICS_MARKER, 1)[1], "'''\n", "\n'''").split())
+    words = text.split()
+    lines = []
+    last_position = -1
+    for i in range(TOPIC_COUNT):
+        sample = " ".join(words[i * len(words) // TOPIC_COUNT:][:10])
+        position = text.find(sample)
+        if sample and position > last_position:
+            lines += [f"**Section {i + 1}**", sample]
+            last_position = position
+    return "\n".join(lines)
+
+
+def answer_enrichment(prompt):
+    content = between(prompt, ENRICH_MARKER, "\n\nAvailable images with context:").strip()
+    sentences = [sentence for sentence in SENTENCE_END.split(content) if sentence]
+    slides = []
+    for i in range(0, len(sentences), BULLETS_PER_SLIDE):
+        bullets = sentences[i:i + BULLETS_PER_SLIDE]
+        slides.append({
+            "title": " ".join(bullets[0].split()[:6]),
+            "text": "\n".join(f"• {bullet}" for bullet in bullets),
+            "image": "",
+            "table": [],
+        })
+    tables = json.loads(between(prompt, "Available table data:\n", "\n\n# Guidelines"))
+    for t, table in enumerate(tables):
+        slides.append({"title": f"Table {t + 1}", "text": "", "image": "", "table": table})
+    return json.dumps(slides, ensure_ascii=False)
+
+
+def answer_refinement(prompt):
+    section = prompt[prompt.index(REFINE_MARKER):]
+    return json.dumps(json.loads(section[section.index("["):]), ensure_ascii=False)
+
+
+def default_responder(body):
+    prompt = body["messages"][-1]["content"]
+    if REFINE_MARKER in prompt:
+        return answer_refinement(prompt)
+    if ENRICH_MARKER in prompt:
+        return answer_enrichment(prompt)
+    if TOPICS_MARKER in prompt:
+        return answer_topics(prompt)
+    return "[]"
+
+
+def make_handler(responder, completion_delay):
+    files = {}
+    batches = {}
+    lock = threading.Lock()
+
+    def run_batch(batch):
+        lines = files[batch["input_file_id"]].decode("utf-8").splitlines()
+        output = []
+        for line in lines:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            content = responder(request["body"])
+            output.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "object": "chat.completion",
+                        "model": request["body"].get("model"),
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    },
+                },
+                "error": None,
+            }))
+        output_id = f"file-{uuid.uuid4().hex[:12]}"
+        files[output_id] = "\n".join(output).encode("utf-8")
+        batch.update({
+            "status": "completed",
+            "output_file_id": output_id,
+            "request_counts": {"total": len(output), "completed": len(output), "failed": 0},
+        })
+
+    class BatchStandinHandler(BaseHTTPRequestHandler):
+        def send_json(self, payload, status=200):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+
+            if self.path == "/v1/files":
+                message = BytesParser(policy=policy.default).parsebytes(
+                    b"Content-Type: " + self.headers["Content-Type"].encode("utf-8") + b"\r\n\r\n" + body
+                )
+                for part in message.iter_parts():
+                    if part.get_param("name", header="content-disposition") == "file":
+                        file_id = f"file-{uuid.uuid4().hex[:12]}"
+                        with lock:
+                            files[file_id] = part.get_payload(decode=True)
+                        return self.send_json({"id": file_id, "object": "file", "purpose": "batch"})
+                return self.send_json({"error": {"message": "missing file"}}, 400)
+
+            if self.path == "/v1/batches":
+                request = json.loads(body)
+                if request.get("input_file_id") not in files:
+                    return self.send_json({"error": {"message": "unknown input_file_id"}}, 404)
+                batch = {
+                    "id": f"batch_{uuid.uuid4().hex[:12]}",
+                    "object": "batch",
+                    "status": "in_progress",
+                    "input_file_id": request["input_file_id"],
+                    "output_file_id": None,
+                    "created_at": time.time(),
+                    "request_counts": {
+                        "total": sum(1 for line in files[request["input_file_id"]].splitlines() if line.strip()),
+                        "completed": 0,
+                        "failed": 0,
+                    },
+                }
+                with lock:
+                    batches[batch["id"]] = batch
+                return self.send_json(batch)
+
+            self.send_json({"error": {"message": "not found"}}, 404)
+
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            if len(parts) == 3 and parts[:2] == ["v1", "batches"]:
+                with lock:
+                    batch = batches.get(parts[2])
+                    if batch and batch["status"] == "in_progress" and time.time() - batch["created_at"] >= completion_delay:
+                        run_batch(batch)
+                if not batch:
+                    return self.send_json({"error": {"message": "not found"}}, 404)
+                return self.send_json(batch)
+
+            if len(parts) == 4 and parts[:2] == ["v1", "files"] and parts[3] == "content":
+                data = files.get(parts[2])
+                if data is None:
+                    return self.send_json({"error": {"message": "not found"}}, 404)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/jsonl")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+
+            self.send_json({"error": {"message": "not found"}}, 404)
+
+        def log_message(self, format, *args):
+            pass
+
+    return BatchStandinHandler
+
+
+def start_standin_server(responder=None, host="127.0.0.1", port=0, completion_delay=0.0):
+    server = ThreadingHTTPServer((host, port), make_handler(responder or default_responder, completion_delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    return server, base_url
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    server, base_url = start_standin_server(port=port)
+    print(f"[INFO] Batch stand-in listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,128 @@
+# circuit_breaker.py
+#
+# Per-provider / per-model circuit breakers. After repeated failures (or one
+# definitive failure such as "model not found") a breaker opens and callers
+# route straight to their fallback for a cooldown window; callers with no
+# fallback wait the cooldown out instead of dropping their work. After the
+# cooldown a single half-open probe is let through; its outcome closes or
+# re-opens the breaker.
+
+import os
+import time
+import threading
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "120"))
+
+breakers = {}
+breaker_lock = threading.Lock()
+
+
+def get_breaker(name):
+    if name not in breakers:
+        breakers[name] = {"state": "closed", "failures": 0, "opened_at": 0.0, "probe_started": 0.0, "trips": 0}
+    return breakers[name]
+
+
+def is_available(name):
+    # Read-only check used for routing decisions; doesn't claim the probe
+    with breaker_lock:
+        breaker = get_breaker(name)
+        if breaker["state"] == "open":
+            return time.monotonic() - breaker["opened_at"] >= BREAKER_COOLDOWN
+        return True
+
+
+def allow_request(name):
+    with breaker_lock:
+        breaker = get_breaker(name)
+        now = time.monotonic()
+        if breaker["state"] == "closed":
+            return True
+        if breaker["state"] == "open":
+            if now - breaker["opened_at"] < BREAKER_COOLDOWN:
+                return False
+            breaker["state"] = "half_open"
+            breaker["probe_started"] = now
+            print(f"[Circuit] {name} half-open, sending a probe request.")
+            return True
+        # Half-open: one probe at a time, unless the last probe never reported back
+        if now - breaker["probe_started"] >= BREAKER_COOLDOWN:
+            breaker["probe_started"] = now
+            return True
+        return False
+
+
+def retry_in(name):
+    with breaker_lock:
+        breaker = get_breaker(name)
+        if breaker["state"] != "open":
+            return 0.0
+        return max(0.0, BREAKER_COOLDOWN - (time.monotonic() - breaker["opened_at"]))
+
+
+def wait_for_request(name, timeout):
+    # allow_request for callers without a fallback: wait for the cooldown (and any
+    # probe in flight) to finish; False only if that takes longer than timeout
+    deadline = time.monotonic() + timeout
+    announced = False
+    while not allow_request(name):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        if not announced:
+            print(f"[Circuit] {name} is marked unavailable, waiting {retry_in(name):.0f}s to probe it.")
+            announced = True
+        time.sleep(min(remaining, max(0.5, retry_in(name))))
+    return True
+
+
+def release_probe(name):
+    # The caller claimed the half-open probe but sent nothing; let the next caller probe
+    with breaker_lock:
+        breaker = get_breaker(name)
+        if breaker["state"] == "half_open":
+            breaker["probe_started"] = 0.0
+
+
+def record_success(name):
+    with breaker_lock:
+        breaker = get_breaker(name)
+        if breaker["state"] != "closed":
+            print(f"[Circuit] {name} recovered, closing breaker.")
+        breaker["state"] = "closed"
+        breaker["failures"] = 0
+
+
+def record_failure(name, trip=False):
+    with breaker_lock:
+        breaker = get_breaker(name)
+        breaker["failures"] += 1
+        if trip or breaker["state"] == "half_open" or breaker["failures"] >= BREAKER_FAILURE_THRESHOLD:
+            if breaker["state"] != "open":
+                print(f"[Circuit] {name} marked unavailable for {BREAKER_COOLDOWN:.0f}s.")
+                breaker["trips"] += 1
+            breaker["state"] = "open"
+            breaker["opened_at"] = time.monotonic()
+
+
+def breaker_states():
+    with breaker_lock:
+        now = time.monotonic()
+        return {
+            name: {
+                "state": breaker["state"],
+                "failures": breaker["failures"],
+                "trips": breaker["trips"],
+                "retry_in": max(0.0, BREAKER_COOLDOWN - (now - breaker["opened_at"])) if breaker["state"] == "open" else 0.0,
+            }
+            for name, breaker in breakers.items()
+        }
+
+
+def print_breaker_states():
+    for name, state in breaker_states().items():
+        print(
+            f"[INFO] Circuit {name}: {state['state']} ({state['failures']} consecutive failures, "
+            f"{state['trips']} trips)"
+        )
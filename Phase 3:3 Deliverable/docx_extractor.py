@@ -0,0 +1,194 @@
+# docx_extractor.py
+#
+# Local .docx backend for extract_document_data. The document body is walked
+# in order with python-docx (paragraphs, tables and the images embedded in
+# them, as in Phase 1's extract_ordered_content), and the result is exposed
+# through the same interface as a LlamaParse result (pages with text and
+# structuredData tables, text documents, image documents), so everything
+# downstream of the parse step is shared. No upload or remote round-trip.
+#
+# Page hints come from the page breaks Word rendered into the file
+# (w:lastRenderedPageBreak); files never rendered by Word fall back to
+# explicit page breaks, and failing that to DOCX_WORDS_PER_PAGE words a page.
+# Every image and table also carries its character offset in the text.
+
+import os
+import re
+from types import SimpleNamespace
+
+DOCX_WORDS_PER_PAGE = int(os.getenv("DOCX_WORDS_PER_PAGE", "500"))
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_EMBED = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed"
+FIGURE_CAPTION = re.compile(r'^\s*fig(?:ure)?\.?\s*\d+', re.IGNORECASE)
+IMAGE_EXTENSIONS = {
+    "image/png": ".png", "image/jpeg": ".jpg", "image/gif": ".gif",
+    "image/bmp": ".bmp", "image/tiff": ".tiff", "image/x-emf": ".emf", "image/x-wmf": ".wmf",
+}
+
+
+def local_name(element):
+    return element.tag.rsplit("}", 1)[-1]
+
+
+def paragraph_text(element):
+    # Text of every run in a w:p, including runs inside hyperlinks and fields
+    parts = []
+    for node in element.iter(f"{{{W_NS}}}t", f"{{{W_NS}}}tab", f"{{{W_NS}}}br"):
+        name = local_name(node)
+        if name == "t":
+            parts.append(node.text or "")
+        elif name == "tab":
+            parts.append("\t")
+        elif node.get(f"{{{W_NS}}}type") in (None, "textWrapping"):
+            parts.append("\n")
+    return "".join(parts).strip()
+
+
+def table_rows(element):
+    rows = []
+    for tr in element.iterchildren(f"{{{W_NS}}}tr"):
+        cells = []
+        for tc in tr.iterchildren(f"{{{W_NS}}}tc"):
+            # Nested tables would repeat their text in the parent cell; keep only direct paragraphs
+            cells.append(" ".join(
+                paragraph_text(p) for p in tc.iterchildren(f"{{{W_NS}}}p") if paragraph_text(p)
+            ))
+        if any(cells):
+            rows.append(cells)
+    return rows
+
+
+def image_embeds(element):
+    return [blip.get(R_EMBED) for blip in element.xpath(".//*[local-name()='blip']") if blip.get(R_EMBED)]
+
+
+def has_rendered_break(element):
+    return bool(element.xpath(".//*[local-name()='lastRenderedPageBreak']"))
+
+
+def has_explicit_break(element):
+    return bool(
+        element.xpath(".//*[local-name()='br'][@*[local-name()='type']='page']")
+        or element.xpath(".//*[local-name()='pageBreakBefore']")
+    )
+
+
+def walk_body(doc):
+    # Yields ("paragraph", text, element) and ("table", rows, element) in document order
+    for child in doc.element.body.iterchildren():
+        name = local_name(child)
+        if name == "p":
+            yield "paragraph", paragraph_text(child), child
+        elif name == "tbl":
+            yield "table", table_rows(child), child
+
+
+def extract_docx(doc_path):
+    from docx import Document
+
+    doc = Document(doc_path)
+    blocks = list(walk_body(doc))
+    rendered_breaks = any(has_rendered_break(element) for _, _, element in blocks)
+    explicit_breaks = not rendered_breaks and any(has_explicit_break(element) for _, _, element in blocks)
+
+    pages = [{"lines": [], "tables": [], "table_offsets": []}]
+    images = []
+    seen_embeds = set()
+    text_length = 0          # length of the joined text so far
+    page_words = 0
+    last_paragraph = ""
+
+    def new_page():
+        nonlocal page_words
+        if pages[-1]["lines"] or pages[-1]["tables"]:
+            pages.append({"lines": [], "tables": [], "table_offsets": []})
+        page_words = 0
+
+    for block_index, (kind, content, element) in enumerate(blocks):
+        # Page boundaries
+        if rendered_breaks and has_rendered_break(element):
+            new_page()
+        elif not rendered_breaks and not explicit_breaks and page_words >= DOCX_WORDS_PER_PAGE:
+            new_page()
+        page = pages[-1]
+        page_index = len(pages) - 1
+
+        if kind == "paragraph":
+            offset = text_length
+            if content:
+                page["lines"].append(content)
+                text_length += len(content) + 1
+                page_words += len(content.split())
+        else:
+            offset = text_length
+            if content:
+                page["tables"].append(content)
+                page["table_offsets"].append(offset)
+                page_words += sum(len(" ".join(row).split()) for row in content)
+
+        for embed in image_embeds(element):
+            if embed in seen_embeds or embed not in doc.part.related_parts:
+                continue
+            seen_embeds.add(embed)
+            part = doc.part.related_parts[embed]
+            images.append({
+                "blob": part.blob,
+                "extension": IMAGE_EXTENSIONS.get(part.content_type, os.path.splitext(str(part.partname))[1] or ".png"),
+                "page_index": page_index,
+                # An image in its own paragraph belongs with the text just before it
+                "context_text": content if kind == "paragraph" and content else last_paragraph,
+                "text_offset": offset,
+                "block": block_index,
+            })
+
+        if kind == "paragraph" and content:
+            last_paragraph = content
+        if explicit_breaks and has_explicit_break(element):
+            new_page()
+
+    # A "Figure N" caption right below the image beats the text above it
+    for image in images:
+        following = next((c for k, c, _ in blocks[image["block"] + 1:] if k == "paragraph" and c), "")
+        if FIGURE_CAPTION.match(following):
+            image["context_text"] = following
+
+    return LocalParseResult(pages, images)
+
+
+class LocalParseResult:
+    # Mirrors the parts of a LlamaParse JobResult that extract_document_data uses
+    def __init__(self, pages, images):
+        self.pages = [
+            SimpleNamespace(
+                page=i + 1,
+                text="\n".join(page["lines"]),
+                structuredData={"tables": page["tables"], "table_offsets": page["table_offsets"]},
+            )
+            for i, page in enumerate(pages)
+        ]
+        self.images = images
+
+    def get_text_documents(self, split_by_page=False):
+        if split_by_page:
+            return [SimpleNamespace(text=page.text) for page in self.pages]
+        # Table-only pages have no text and must not add blank lines (offsets count on it)
+        return [SimpleNamespace(text="\n".join(page.text for page in self.pages if page.text))]
+
+    def get_image_documents(self, include_screenshot_images=True, include_object_images=True, image_download_dir=None):
+        # Embedded pictures are "object" images; a local parse has no page screenshots
+        if not include_object_images:
+            return []
+        os.makedirs(image_download_dir, exist_ok=True)
+        documents = []
+        for idx, image in enumerate(self.images):
+            image_path = os.path.join(image_download_dir, f"docx_image_{idx}{image['extension']}")
+            with open(image_path, "wb") as f:
+                f.write(image["blob"])
+            documents.append(SimpleNamespace(
+                image_path=image_path,
+                page_index=image["page_index"],
+                context_text=image["context_text"],
+                text_offset=image["text_offset"],
+            ))
+        return documents
@@ -0,0 +1,76 @@
+# image_dedup.py
+#
+# Collapses near-duplicate extracted images (logos, banners, page headers
+# repeated on every page) to one canonical asset, so captioning, slide
+# mapping and pptx embedding run once per unique image. Images are compared
+# by a 64-bit difference hash (dHash) of an 8x9 grayscale thumbnail; two
+# images with a similar aspect ratio whose hashes differ in at most
+# IMAGE_DEDUP_DISTANCE bits are the same asset. The first occurrence in
+# document order is kept, and it records every page the asset appeared on.
+
+import os
+
+import numpy as np
+from PIL import Image
+
+IMAGE_DEDUP_ENABLED = os.getenv("IMAGE_DEDUP", "1") != "0"
+IMAGE_DEDUP_DISTANCE = int(os.getenv("IMAGE_DEDUP_DISTANCE", "6"))
+MAX_ASPECT_DIFFERENCE = 0.1
+
+
+def perceptual_hash(image_path):
+    # Returns (dhash, aspect ratio)
+    with Image.open(image_path) as img:
+        img.draft("L", (64, 64))
+        aspect = img.size[0] / max(1, img.size[1])
+        if img.mode not in ("L", "RGB", "RGBA"):
+            img = img.convert("RGB")
+        # BOX averages every source pixel, so resizing before convert() loses nothing
+        pixels = np.asarray(img.resize((9, 8), Image.BOX).convert("L"), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0]), aspect
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def is_duplicate(entry, canonical, max_distance):
+    if abs(entry["aspect"] - canonical["aspect"]) > MAX_ASPECT_DIFFERENCE * canonical["aspect"]:
+        return False
+    return hamming(entry["hash"], canonical["hash"]) <= max_distance
+
+
+def dedup_images(images, max_distance=None):
+    # images: dicts with "path", "page_index", "hash", "aspect", in document order.
+    # Returns {canonical_path: {"pages": [...], "duplicates": [...]}} in the same order.
+    max_distance = IMAGE_DEDUP_DISTANCE if max_distance is None else max_distance
+    canonical = []
+    sources = {}
+    for entry in images:
+        match = None
+        if IMAGE_DEDUP_ENABLED and entry.get("hash") is not None:
+            match = next((c for c in canonical if is_duplicate(entry, c, max_distance)), None)
+        if match is None:
+            if entry.get("hash") is not None:
+                canonical.append(entry)
+            sources[entry["path"]] = {"pages": [entry["page_index"]], "duplicates": []}
+            continue
+        source = sources[match["path"]]
+        if entry["page_index"] not in source["pages"]:
+            source["pages"].append(entry["page_index"])
+        source["duplicates"].append(entry["path"])
+    return sources
+
+
+def remove_duplicates(sources):
+    # Duplicates are deleted from images/, so only canonical assets are left to embed
+    removed = 0
+    for source in sources.values():
+        for path in source["duplicates"]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                print(f"[WARNING] Could not remove duplicate image {path}: {e}")
+    return removed
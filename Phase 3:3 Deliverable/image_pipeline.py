@@ -0,0 +1,186 @@
+# image_pipeline.py
+#
+# Post-processing of the images a parse step downloaded: drop blank and
+# solid-colour images, hash the rest for deduplication, find each image's
+# context (figure label, caption) and rename it to
+# img_p{page}_{idx}_{label}.png.
+#
+# Context comes from a page index built once per document (page lines, the
+# lines carrying figure labels, each page's last line, and a figure-number ->
+# caption map), so finding an image's context is a lookup rather than a rescan
+# of its page. That part runs in the parent; the pixel work (filtering and
+# hashing) is independent per image and is spread over a process pool.
+# Results (and their debug output) come back in download order, so file names
+# and logs are the same for any worker count. Small batches stay in-process,
+# where starting a pool would cost more than it saves.
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from image_stats import image_stats
+from image_dedup import perceptual_hash
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 1)))
+IMAGE_POOL_MIN_IMAGES = int(os.getenv("IMAGE_POOL_MIN_IMAGES", "16"))
+
+
+FIGURE_PATTERN = re.compile(r'(fig(?:ure)?\.?\s*(\d+))(?:\.\s*(.*))?', re.IGNORECASE)
+NON_WORD = re.compile(r'\W+')
+
+
+def build_page_index(page_texts):
+    index = {"lines": [], "figure_lines": [], "last_lines": [], "captions": {}}
+    for page_text in page_texts:
+        lines = [line.strip() for line in (page_text or "").split('\n')]
+        figure_lines = []
+        for line_no, line in enumerate(lines):
+            match = FIGURE_PATTERN.search(line)
+            if not match:
+                continue
+            figure_lines.append(line_no)
+            # The first captioned mention of a figure number is its caption
+            if match.group(3) and match.group(3).strip():
+                index["captions"].setdefault(match.group(2), match.group(3).strip())
+        index["lines"].append(lines)
+        index["figure_lines"].append(figure_lines)
+        index["last_lines"].append(next((line for line in reversed(lines) if line), ""))
+    return index
+
+
+def find_context(index, page_index, context_text):
+    # Step 1: context the parser attached to the image
+    if context_text:
+        return context_text
+
+    page_count = len(index["lines"])
+    if 0 <= page_index < page_count:
+        # Step 2: the first figure label on the page
+        if index["figure_lines"][page_index]:
+            return index["lines"][page_index][index["figure_lines"][page_index][0]]
+        # Step 3: the line just above the image (assume image at bottom half of page)
+        if index["last_lines"][page_index]:
+            return index["last_lines"][page_index]
+
+    # Step 4: fallback - last line of the previous page
+    if 0 < page_index <= page_count:
+        return index["last_lines"][page_index - 1]
+    return ''
+
+
+def describe_image(index, idx, page_index, context_text):
+    # Returns (context_text, figure_label, caption, file name)
+    context_text = find_context(index, page_index, context_text)
+    figure_label = None
+    caption = ''
+    match = FIGURE_PATTERN.search(context_text)
+    if match:
+        figure_label = match.group(1).replace(" ", "_").upper()
+        # A bare "Figure 3" reference borrows the caption printed elsewhere in the document
+        caption = (match.group(3) or '').strip() or index["captions"].get(match.group(2), '')
+
+    parts = []
+    if figure_label:
+        parts.append(figure_label)
+    if caption:
+        parts.append('_'.join(caption.split()[:6]))  # first 6 words only
+
+    base_name = "_".join(parts) if parts else "image"
+    base_name = NON_WORD.sub('_', base_name)  # sanitize
+    return context_text, figure_label, caption, f"img_p{page_index}_{idx}_{base_name}.png"
+
+
+def process_image(job):
+    # Runs in a worker process; returns everything the parent needs plus the log lines
+    idx, image_path = job["idx"], job["image_path"]
+    page_index = job["page_index"]
+    logs = [f"[DEBUG] Processing image: {idx}"]
+    result = {"idx": idx, "status": "kept", "path": None, "page_index": page_index,
+              "context_text": "", "text_offset": job.get("text_offset"), "seconds": 0.0, "logs": logs}
+
+    # Skip solid-colour and mostly white images
+    try:
+        stats = image_stats(image_path)
+        result["seconds"] = stats["seconds"]
+        logs.append(
+            f"[DEBUG] Image stats for {os.path.basename(image_path)}: dominant_ratio={stats['dominant_ratio']:.2f}, "
+            f"white_ratio={stats['white_ratio']:.2f} in {stats['seconds'] * 1000:.1f}ms"
+        )
+        if stats["verdict"] == "solid":
+            logs.append(f"[DEBUG] Skipping solid-color image {image_path} (dominant_ratio={stats['dominant_ratio']:.2f})")
+            result["status"] = "solid"
+            return result
+        if stats["verdict"] == "white":
+            logs.append(f"[DEBUG] Skipping blank white image {image_path} (white_ratio={stats['white_ratio']:.2f})")
+            result["status"] = "white"
+            return result
+    except Exception as e:
+        logs.append(f"[WARNING] Could not process image {image_path}: {e}")
+
+    # Perceptual hash for near-duplicate detection, computed here so it runs in the pool too
+    try:
+        result["hash"], result["aspect"] = perceptual_hash(image_path)
+    except Exception as e:
+        result["hash"] = result["aspect"] = None
+        logs.append(f"[WARNING] Could not hash image {image_path}: {e}")
+
+    result["context_text"] = job["context_text"]
+    logs.append(f"[DEBUG] context_text: {job['context_text']}")
+    logs.append(f"[DEBUG] Extracted figure_label: {job['figure_label']}")
+    logs.append(f"[DEBUG] Extracted caption: {job['caption']}")
+    # The parent renames, so a failed pool never leaves files half-renamed
+    result["path"] = job["new_path"]
+    return result
+
+
+def rename_image(job, result):
+    try:
+        os.rename(job["image_path"], result["path"])
+        result["logs"].append(f"[DEBUG] Renamed image to: {os.path.basename(result['path'])}")
+    except Exception as e:
+        result["status"] = "failed"
+        result["logs"].append(f"[WARNING] Failed to rename image {job['image_path']}: {e}")
+
+
+def image_jobs(image_docs, page_texts, images_dir):
+    index = build_page_index(page_texts)
+    jobs = []
+    for idx, image_doc in enumerate(image_docs):
+        page_index = getattr(image_doc, 'page_index', idx)
+        context_text, figure_label, caption, new_filename = describe_image(
+            index, idx, page_index, getattr(image_doc, 'context_text', '') or ''
+        )
+        jobs.append({
+            "idx": idx,
+            "image_path": image_doc.image_path,
+            "new_path": os.path.join(images_dir, new_filename),
+            "page_index": page_index,
+            "context_text": context_text,
+            "figure_label": figure_label,
+            "caption": caption,
+            "text_offset": getattr(image_doc, 'text_offset', None),
+        })
+    return jobs
+
+
+def process_images(image_docs, page_texts, images_dir, max_workers=None):
+    # Returns one result per image, in image_docs order
+    jobs = image_jobs(image_docs, page_texts, images_dir)
+    max_workers = IMAGE_WORKERS if max_workers is None else max_workers
+
+    results = None
+    if max_workers > 1 and len(jobs) >= IMAGE_POOL_MIN_IMAGES:
+        try:
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+                results = list(executor.map(process_image, jobs, chunksize=max(1, len(jobs) // (max_workers * 4))))
+        except Exception as e:
+            print(f"[WARNING] Image process pool failed ({e}), processing images in-process.")
+    if results is None:
+        results = [process_image(job) for job in jobs]
+
+    for job, result in zip(jobs, results):
+        if result["status"] == "kept":
+            rename_image(job, result)
+        for line in result["logs"]:
+            print(line)
+    return results
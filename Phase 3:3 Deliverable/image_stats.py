@@ -0,0 +1,65 @@
+# image_stats.py
+#
+# Blank / solid-colour detection for extracted images. Each image is shrunk
+# to at most IMAGE_STATS_MAX_SIDE pixels on its long side (nearest-neighbour,
+# so no blended colours appear) and both ratios are computed on the NumPy
+# array:
+#   dominant_ratio  share of pixels with the most common RGB colour
+#   white_ratio     share of pixels whose grayscale value is above 245
+# This takes milliseconds even for full-page screenshots, and unlike
+# Image.getcolors it never gives up on images with many colours.
+
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+IMAGE_STATS_MAX_SIDE = int(os.getenv("IMAGE_STATS_MAX_SIDE", "256"))
+SOLID_COLOR_RATIO = float(os.getenv("IMAGE_SOLID_COLOR_RATIO", "0.98"))
+WHITE_RATIO = float(os.getenv("IMAGE_WHITE_RATIO", "0.98"))
+WHITE_LEVEL = 245
+
+
+def load_pixels(image_path, max_side=None):
+    max_side = max_side or IMAGE_STATS_MAX_SIDE
+    with Image.open(image_path) as img:
+        # JPEG can decode straight at a reduced scale
+        img.draft("RGB", (max_side, max_side))
+        # Shrink before converting, so only the small image goes through convert()
+        if max(img.size) > max_side:
+            scale = max_side / max(img.size)
+            img = img.resize(
+                (max(1, round(img.size[0] * scale)), max(1, round(img.size[1] * scale))),
+                Image.NEAREST
+            )
+        return np.asarray(img.convert("RGB"), dtype=np.uint8)
+
+
+def pixel_ratios(pixels):
+    flat = pixels.reshape(-1, 3).astype(np.uint32)
+    packed = (flat[:, 0] << 16) | (flat[:, 1] << 8) | flat[:, 2]
+    _, counts = np.unique(packed, return_counts=True)
+    dominant_ratio = counts.max() / packed.size
+
+    # Same ITU-R 601 weights as Image.convert("L")
+    gray = (flat[:, 0] * 299 + flat[:, 1] * 587 + flat[:, 2] * 114) // 1000
+    white_ratio = np.count_nonzero(gray > WHITE_LEVEL) / packed.size
+    return float(dominant_ratio), float(white_ratio)
+
+
+def image_stats(image_path):
+    start = time.perf_counter()
+    dominant_ratio, white_ratio = pixel_ratios(load_pixels(image_path))
+    if dominant_ratio > SOLID_COLOR_RATIO:
+        verdict = "solid"
+    elif white_ratio > WHITE_RATIO:
+        verdict = "white"
+    else:
+        verdict = "keep"
+    return {
+        "dominant_ratio": dominant_ratio,
+        "white_ratio": white_ratio,
+        "verdict": verdict,
+        "seconds": time.perf_counter() - start,
+    }
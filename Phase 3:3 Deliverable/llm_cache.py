@@ -0,0 +1,167 @@
+# llm_cache.py
+#
+# Content-addressed on-disk cache for LLM responses. Entries are keyed by
+# provider, model, request parameters and a SHA-256 of the prompt, so a rerun
+# with identical prompts costs no API calls. The cache is trimmed by age and by
+# total size (least recently used first; an entry's mtime is its last access).
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+CACHE_DIR = os.getenv(
+    "LLM_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "intermediate", "llm_cache")
+)
+CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024)
+CACHE_MAX_AGE = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30")) * 24 * 3600
+
+cache_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+cache_lock = threading.Lock()
+
+
+def hash_text(text):
+    if isinstance(text, str):
+        text = text.encode("utf-8")
+    return hashlib.sha256(text).hexdigest()
+
+
+def make_cache_key(provider, model, params, prompt):
+    key_data = {
+        "provider": provider,
+        "model": model,
+        "params": params or {},
+        "prompt_sha256": hash_text(prompt),
+    }
+    return hash_text(json.dumps(key_data, sort_keys=True))
+
+
+def cache_entry_path(key):
+    return os.path.join(CACHE_DIR, key[:2], key + ".json")
+
+
+def count_stat(name, amount=1):
+    with cache_lock:
+        cache_stats[name] += amount
+
+
+def cache_get(key):
+    if not CACHE_ENABLED:
+        return None
+
+    path = cache_entry_path(key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        count_stat("misses")
+        return None
+
+    if time.time() - entry.get("created", 0) > CACHE_MAX_AGE:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        count_stat("misses")
+        count_stat("evictions")
+        return None
+
+    try:
+        os.utime(path, None)  # mark as recently used
+    except OSError:
+        pass
+    count_stat("hits")
+    return entry.get("response")
+
+
+def cache_put(key, response, meta=None):
+    if not CACHE_ENABLED or response is None:
+        return
+
+    path = cache_entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    entry = {"created": time.time(), "meta": meta or {}, "response": response}
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[WARNING] Could not write LLM cache entry {key}: {e}")
+        return
+
+    count_stat("writes")
+    if cache_stats["writes"] % 20 == 1:
+        evict_cache()
+
+
+def evict_cache(max_bytes=None, max_age=None):
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    max_age = CACHE_MAX_AGE if max_age is None else max_age
+    if not os.path.isdir(CACHE_DIR):
+        return 0
+
+    now = time.time()
+    entries = []
+    removed = 0
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if now - stat.st_mtime > max_age:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_size = sum(size for _, size, _ in entries)
+    entries.sort()  # oldest access first
+    for _, size, path in entries:
+        if total_size <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+            total_size -= size
+        except OSError:
+            pass
+
+    if removed:
+        count_stat("evictions", removed)
+    return removed
+
+
+def cached_call(provider, model, params, prompt, call, on_hit=None, should_cache=None):
+    # should_cache(response) -> bool keeps truncated or malformed answers out of the
+    # cache; entries that fail it (written before it was passed) count as misses
+    key = make_cache_key(provider, model, params, prompt)
+    cached = cache_get(key)
+    if cached is not None and (should_cache is None or should_cache(cached)):
+        if on_hit:
+            on_hit(cached)
+        return cached
+
+    response = call()
+    if response is not None and (should_cache is None or should_cache(response)):
+        cache_put(key, response, {"provider": provider, "model": model, "params": params})
+    return response
+
+
+def print_cache_stats():
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    hit_rate = (cache_stats["hits"] / lookups * 100) if lookups else 0.0
+    print(
+        f"[INFO] LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+        f"({hit_rate:.0f}% hit rate), {cache_stats['writes']} writes, {cache_stats['evictions']} evictions"
+    )
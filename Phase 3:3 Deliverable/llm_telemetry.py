@@ -0,0 +1,198 @@
+# llm_telemetry.py
+#
+# Ledger of every external call the pipeline makes (LLM requests, cache hits,
+# batch results, LlamaParse). One JSON line per call goes to
+# intermediate/llm_telemetry.jsonl with the stage, model, token usage, wall
+# latency, retries and an estimated cost, so a slow or expensive run can be
+# broken down afterwards:
+#
+#   python llm_telemetry.py            # every run, plus stages of the latest one
+#   python llm_telemetry.py <run_id>   # stages of one run
+
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+TELEMETRY_ENABLED = os.getenv("LLM_TELEMETRY", "1") != "0"
+TELEMETRY_PATH = os.getenv(
+    "LLM_TELEMETRY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "intermediate", "llm_telemetry.jsonl")
+)
+RUN_ID = os.getenv("LLM_RUN_ID") or time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+
+# USD per million tokens (input, output); list prices, so costs are estimates
+MODEL_PRICES = {
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "claude-3-5-sonnet-20241022": (3.0, 15.0),
+}
+LLAMAPARSE_PRICE_PER_PAGE = 0.003
+BATCH_DISCOUNT = 0.5
+
+run_records = []
+telemetry_lock = threading.Lock()
+stage_local = threading.local()
+
+
+def current_stage():
+    return getattr(stage_local, "name", None) or "other"
+
+
+@contextmanager
+def llm_stage(name):
+    # Usable as `with llm_stage("topics"):` or as a function decorator
+    previous = getattr(stage_local, "name", None)
+    stage_local.name = name
+    try:
+        yield
+    finally:
+        stage_local.name = previous
+
+
+def bind_stage(call):
+    # Worker threads don't inherit the caller's stage, so carry it over explicitly
+    stage = current_stage()
+
+    def run(*args, **kwargs):
+        with llm_stage(stage):
+            return call(*args, **kwargs)
+    return run
+
+
+def count_attempts(call):
+    # Wraps a request so the number of attempts made by a retry loop can be read back
+    attempts = {"count": 0}
+
+    def attempt():
+        attempts["count"] += 1
+        return call()
+    return attempt, attempts
+
+
+def estimate_cost(model, prompt_tokens=0, completion_tokens=0, pages=0, batch=False):
+    if model == "llamaparse":
+        return pages * LLAMAPARSE_PRICE_PER_PAGE
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    cost = (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+def record_call(provider, model, prompt_tokens=0, completion_tokens=0, latency=0.0, retries=0,
+                cache_hit=False, ok=True, batch=False, pages=0, stage=None):
+    record = {
+        "run_id": RUN_ID,
+        "time": round(time.time(), 3),
+        "stage": stage or current_stage(),
+        "provider": provider,
+        "model": model,
+        "prompt_tokens": int(prompt_tokens or 0),
+        "completion_tokens": int(completion_tokens or 0),
+        "latency": round(latency, 3),
+        "retries": max(0, retries),
+        "cache_hit": cache_hit,
+        "ok": ok,
+        "batch": batch,
+        # A cache hit costs nothing; its tokens are still logged to show what was saved
+        "cost": 0.0 if cache_hit else round(estimate_cost(model, prompt_tokens, completion_tokens, pages, batch), 6),
+    }
+    if pages:
+        record["pages"] = pages
+
+    with telemetry_lock:
+        run_records.append(record)
+        if not TELEMETRY_ENABLED:
+            return record
+        try:
+            os.makedirs(os.path.dirname(TELEMETRY_PATH), exist_ok=True)
+            with open(TELEMETRY_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            print(f"[WARNING] Could not write telemetry record: {e}")
+    return record
+
+
+def load_records(path=None):
+    records = []
+    try:
+        with open(path or TELEMETRY_PATH, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return records
+
+
+def route_of(record):
+    return f"{record.get('stage')} -> {record.get('model')}"
+
+
+def summarize(records, key="stage"):
+    # key is a record field or a function of the record
+    summary = {}
+    for record in records:
+        group = summary.setdefault(key(record) if callable(key) else record.get(key), {
+            "calls": 0, "cache_hits": 0, "failures": 0, "retries": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "latencies": [],
+        })
+        group["calls"] += 1
+        group["cache_hits"] += 1 if record.get("cache_hit") else 0
+        group["failures"] += 0 if record.get("ok", True) else 1
+        group["retries"] += record.get("retries", 0)
+        group["prompt_tokens"] += record.get("prompt_tokens", 0)
+        group["completion_tokens"] += record.get("completion_tokens", 0)
+        group["cost"] += record.get("cost", 0.0)
+        if not record.get("cache_hit"):
+            group["latencies"].append(record.get("latency", 0.0))
+
+    for group in summary.values():
+        latencies = sorted(group.pop("latencies"))
+        group["latency_total"] = sum(latencies)
+        group["latency_p95"] = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else 0.0
+    return summary
+
+
+def format_group(name, group):
+    return (
+        f"{name}: {group['calls']} calls ({group['cache_hits']} cached, {group['failures']} failed, "
+        f"{group['retries']} retries), {group['prompt_tokens']} prompt / {group['completion_tokens']} completion tokens, "
+        f"{group['latency_total']:.1f}s in calls (p95 {group['latency_p95']:.1f}s), est. ${group['cost']:.2f}"
+    )
+
+
+def print_telemetry_summary(records=None, run_id=None):
+    if records is None:
+        with telemetry_lock:
+            records = list(run_records)
+        run_id = RUN_ID
+    if not records:
+        return
+
+    total = summarize(records, key="run_id")
+    for name, group in total.items():
+        print(f"[INFO] Telemetry run {format_group(run_id or name, group)}")
+    for name, group in sorted(summarize(records).items(), key=lambda item: -item[1]["latency_total"]):
+        print(f"[INFO]   {format_group(name, group)}")
+    for name, group in sorted(summarize(records, key=route_of).items()):
+        print(f"[INFO]   route {format_group(name, group)}")
+
+
+if __name__ == "__main__":
+    all_records = load_records()
+    if not all_records:
+        print(f"No telemetry recorded at {TELEMETRY_PATH}")
+        sys.exit(0)
+
+    if len(sys.argv) > 1:
+        selected = sys.argv[1]
+    else:
+        for run, group in summarize(all_records, key="run_id").items():
+            print(f"[INFO] Run {format_group(run, group)}")
+        selected = all_records[-1]["run_id"]
+    print_telemetry_summary([r for r in all_records if r.get("run_id") == selected], run_id=selected)
@@ -0,0 +1,62 @@
+# model_router.py
+#
+# Picks the OpenAI model for a request from its pipeline stage and prompt
+# size. Structural tasks (topic markers, table extraction) go to a small fast
+# model; enrichment and refinement keep the large one. Each stage has an
+# ordered list of routes; the first one whose prompt-size limit and context
+# window fit the prompt wins. Routes can be overridden per stage:
+#
+#   LLM_ROUTE_TOPICS="gpt-3.5-turbo:12000,gpt-4-turbo"
+#
+# i.e. gpt-3.5-turbo for prompts up to 12000 tokens, gpt-4-turbo beyond that.
+
+import os
+
+from token_budget import count_tokens, context_window
+
+DEFAULT_ROUTES = {
+    "topics": "gpt-3.5-turbo",
+    "tables": "gpt-3.5-turbo,gpt-4-turbo",  # the table prompt carries the whole document
+    "enrichment": "gpt-4",
+    "refinement": "gpt-4",
+    "captions": "gpt-4-turbo",
+}
+DEFAULT_MODEL = "gpt-4"
+# Model used when the routed model rejects a request
+FALLBACK_MODELS = {
+    "gpt-4": "gpt-3.5-turbo",
+    "gpt-4-turbo": "gpt-4",
+}
+# Smallest completion a route must still have room for
+MIN_COMPLETION_TOKENS = 256
+
+
+def parse_routes(spec):
+    routes = []
+    for part in spec.split(","):
+        model, _, limit = part.strip().partition(":")
+        if model:
+            routes.append((model, int(limit) if limit else None))
+    return routes
+
+
+def stage_routes(stage):
+    spec = os.getenv(f"LLM_ROUTE_{(stage or '').upper()}") or DEFAULT_ROUTES.get(stage, DEFAULT_MODEL)
+    return parse_routes(spec)
+
+
+def route_model(stage, prompt):
+    routes = stage_routes(stage)
+    for model, limit in routes:
+        prompt_tokens = count_tokens(prompt, model)
+        if limit is not None and prompt_tokens > limit:
+            continue
+        if prompt_tokens + MIN_COMPLETION_TOKENS > context_window(model):
+            continue
+        return model
+    # Nothing fits: the last route is the stage's largest model
+    return routes[-1][0] if routes else DEFAULT_MODEL
+
+
+def fallback_model(model):
+    return FALLBACK_MODELS.get(model)
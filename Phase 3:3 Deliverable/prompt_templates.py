@@ -259,4 +259,55 @@ Return a valid JSON array of the refined slides.
 
 Here is the original slide JSON:
 {original_slide_json}
-"""
\ No newline at end of file
+"""
+SLIDE_WINDOW_REFINEMENT_PROMPT = """
+You are refining one section of a structured presentation generated from a document.
+
+Each slide contains:
+- A "title"
+- A "text" field (bullet points)
+- An optional "image"
+- An optional "table" (list of rows and columns)
+
+Your task is to enhance the overall quality of the slides following these rules:
+
+1. If a slide contains both a table and bullet points, avoid repeating the same information in both.
+   - Use bullets to provide context, explanation, or additional perspectives.
+
+2. Across the entire deck, avoid repeating the same information multiple times across different slides.
+   - The slides listed under "Earlier slides" are already in the deck. Do not repeat what they cover.
+   - If multiple slides cover overlapping table rows or bullet points, adjust later slides to focus on different aspects.
+   - Prefer expansion, contrast, or new details instead of repeating facts already covered earlier.
+
+3. Improve bullet point quality:
+   - Make each bullet precise, informative, and fact-driven.
+   - Avoid vague or generic buzzwords.
+
+4. Improve presentation flow:
+   - Ensure logical progression of ideas across slides.
+   - Reword titles slightly if needed for clarity and smooth transitions.
+
+5. Maintain formatting:
+   - Keep the JSON structure exactly the same.
+   - Modify only the "title" and "text" fields.
+   - Do not change or remove "table" or "image" fields.
+   - Return exactly {slide_count} slides, in the same order as given.
+
+Return a valid JSON array of the refined slides.
+
+Earlier slides (title: key point):
+{deck_summary}
+
+Here is the original slide JSON for this section:
+{original_slide_json}
+"""
+
+SLIDE_CONTINUATION_PROMPT = """
+{original_prompt}
+
+Your previous answer to this request was cut off. These slides were already generated, in this order:
+{generated_titles}
+
+Continue from where they stop: return ONLY the remaining slides, covering the rest of the text content, as a valid JSON array in the same format.
+Do not repeat any of the slides listed above.
+"""
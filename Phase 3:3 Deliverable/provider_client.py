@@ -0,0 +1,104 @@
+# provider_client.py
+#
+# Hedged requests across LLM providers. The primary provider gets the prompt
+# first; if it hasn't produced a valid answer within its recent p95 latency
+# (or fails outright), the same prompt goes to the secondary provider and the
+# first valid answer wins. Latency samples come from the upstream request
+# functions, so cache hits don't drag the p95 down, and are kept per
+# "provider:model" (the same names the circuit breakers use), so fast
+# gpt-3.5-turbo topic calls don't set the hedge delay for gpt-4 enrichment.
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "30"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2"))
+HEDGE_MIN_SAMPLES = 10
+HEDGE_PERCENTILE = 0.95
+
+latency_samples = {}
+hedge_lock = threading.Lock()
+hedge_stats = {"calls": 0, "hedged": 0, "primary_wins": 0, "secondary_wins": 0, "failed": 0}
+hedge_executor = ThreadPoolExecutor(max_workers=int(os.getenv("HEDGE_MAX_WORKERS", "16")))
+
+
+def record_latency(route, seconds):
+    # route is "provider:model"
+    with hedge_lock:
+        latency_samples.setdefault(route, deque(maxlen=200)).append(seconds)
+
+
+def latency_percentile(route, percentile=HEDGE_PERCENTILE):
+    with hedge_lock:
+        samples = sorted(latency_samples.get(route, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[min(len(samples) - 1, int(percentile * len(samples)))]
+
+
+def hedge_delay(route):
+    p95 = latency_percentile(route)
+    if p95 is None:
+        return HEDGE_DEFAULT_DELAY
+    return max(HEDGE_MIN_DELAY, p95)
+
+
+def count_hedge_stat(name):
+    with hedge_lock:
+        hedge_stats[name] += 1
+
+
+def hedged_call(primary, secondary, validate=None, delay=None, route=None):
+    # primary / secondary are (provider_name, call) pairs; call() returns text or None.
+    # route ("provider:model") picks the latency samples for the delay
+    validate = validate or (lambda text: bool(text))
+    delay = hedge_delay(route or primary[0]) if delay is None else delay
+    count_hedge_stat("calls")
+
+    futures = {hedge_executor.submit(primary[1]): primary[0]}
+    done, _ = wait(futures, timeout=delay)
+    fallback_result = None
+
+    for future in done:
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"[WARNING] {primary[0]} call failed: {e}")
+            continue
+        if validate(result):
+            count_hedge_stat("primary_wins")
+            return result
+        fallback_result = result
+
+    reason = "returned no valid answer" if done else f"has not answered after {delay:.1f}s"
+    print(f"[INFO] {primary[0]} {reason}, hedging with {secondary[0]}...")
+    count_hedge_stat("hedged")
+    futures[hedge_executor.submit(secondary[1])] = secondary[0]
+
+    pending = {future for future in futures if future not in done}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[WARNING] {futures[future]} call failed: {e}")
+                continue
+            if validate(result):
+                count_hedge_stat("primary_wins" if futures[future] == primary[0] else "secondary_wins")
+                return result
+            if fallback_result is None:
+                fallback_result = result
+
+    count_hedge_stat("failed")
+    return fallback_result
+
+
+def print_hedge_stats():
+    print(
+        f"[INFO] Hedging: {hedge_stats['calls']} calls, {hedge_stats['hedged']} hedged, "
+        f"{hedge_stats['primary_wins']} primary wins, {hedge_stats['secondary_wins']} secondary wins, "
+        f"{hedge_stats['failed']} without a valid answer"
+    )
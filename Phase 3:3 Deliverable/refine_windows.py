@@ -0,0 +1,74 @@
+# refine_windows.py
+#
+# Windowed deck refinement. Instead of sending a chunk's whole slide list in
+# one prompt, the slides are cut into overlapping windows that are refined in
+# parallel. Each window also gets a compact summary of the slides before it,
+# so the cross-slide "don't repeat earlier slides" rule still has something to
+# work with. Every slide is owned by exactly one window, which makes the merge
+# independent of the order in which windows finish.
+
+import os
+import re
+
+REFINE_WINDOW_SIZE = int(os.getenv("REFINE_WINDOW_SIZE", "6"))
+REFINE_WINDOW_OVERLAP = int(os.getenv("REFINE_WINDOW_OVERLAP", "1"))
+REFINE_SUMMARY_SLIDES = int(os.getenv("REFINE_SUMMARY_SLIDES", "30"))
+SUMMARY_WORDS = 12
+
+BULLET_PREFIX = re.compile(r'^[\s•\-\*]+')
+
+
+def plan_refine_windows(slide_count, size=None, overlap=None):
+    # Returns (start, end, owned_start): slides [start, owned_start) are the
+    # overlap carried over from the previous window and are shown for context only
+    size = max(1, REFINE_WINDOW_SIZE if size is None else size)
+    overlap = max(0, min(size - 1, REFINE_WINDOW_OVERLAP if overlap is None else overlap))
+    windows = []
+    owned_start = 0
+    while owned_start < slide_count:
+        start = max(0, owned_start - overlap)
+        end = min(slide_count, start + size)
+        windows.append((start, end, owned_start))
+        owned_start = end
+    return windows
+
+
+def first_point(text):
+    for line in str(text or "").splitlines():
+        line = BULLET_PREFIX.sub("", line).strip()
+        if line:
+            words = line.split()
+            return " ".join(words[:SUMMARY_WORDS]) + ("..." if len(words) > SUMMARY_WORDS else "")
+    return ""
+
+
+def summarize_slides(slides, limit=None):
+    limit = REFINE_SUMMARY_SLIDES if limit is None else limit
+    recent = slides[-limit:] if limit else []
+    lines = [f"- {slide.get('title', '').strip()}: {first_point(slide.get('text'))}" for slide in recent]
+    if len(slides) > len(recent):
+        lines.insert(0, f"- ({len(slides) - len(recent)} earlier slides omitted)")
+    return "\n".join(lines) if lines else "(none)"
+
+
+def merge_refined_windows(slides, windows, results):
+    # results[i] is the parsed slide list for windows[i], or None if that window failed
+    merged = []
+    for (start, end, owned_start), refined in zip(windows, results):
+        if not isinstance(refined, list) or len(refined) != end - start:
+            if refined is not None:
+                print(f"[WARNING] Refinement of slides {start+1}-{end} returned {len(refined) if isinstance(refined, list) else 'no'} slides; keeping the originals.")
+            merged.extend(slides[owned_start:end])
+            continue
+        for offset in range(owned_start - start, end - start):
+            original = slides[start + offset]
+            candidate = refined[offset]
+            if not isinstance(candidate, dict) or not candidate.get("title"):
+                merged.append(original)
+                continue
+            # Only title and text may change; assets always come from the original slide
+            slide = dict(original)
+            slide["title"] = candidate["title"]
+            slide["text"] = candidate.get("text", original.get("text", ""))
+            merged.append(slide)
+    return merged
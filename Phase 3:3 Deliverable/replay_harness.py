@@ -0,0 +1,275 @@
+# replay_harness.py
+#
+# Record/replay stand-in for the external services (LlamaParse, OpenAI and
+# Anthropic), so the pipeline can be profiled and load-tested without network
+# access or API keys.
+#
+#   REPLAY_MODE=record  run against the live services and save every response
+#                       (parse results with their pages, structuredData and
+#                       image files; chat completions, including streams)
+#   REPLAY_MODE=replay  serve the saved responses instead of calling out; a
+#                       request without a fixture raises ReplayMiss
+#
+# Replayed calls sleep for a latency drawn from REPLAY_LATENCY (or the
+# per-service REPLAY_LATENCY_OPENAI / _ANTHROPIC / _LLAMAPARSE):
+#   recorded              the latency measured when the fixture was recorded (default)
+#   none                  no delay
+#   fixed:S               always S seconds
+#   uniform:LOW,HIGH      uniformly distributed
+#   lognormal:MEDIAN,SIGMA
+# REPLAY_LATENCY_SCALE multiplies every sampled latency; REPLAY_SEED makes the
+# draws reproducible.
+
+import os
+import json
+import math
+import time
+import shutil
+import random
+import hashlib
+import tempfile
+import threading
+
+REPLAY_MODE = os.getenv("REPLAY_MODE", "off").lower()
+REPLAY_DIR = os.getenv(
+    "REPLAY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "intermediate", "replay_fixtures")
+)
+REPLAY_LATENCY = os.getenv("REPLAY_LATENCY", "recorded")
+REPLAY_LATENCY_SCALE = float(os.getenv("REPLAY_LATENCY_SCALE", "1"))
+
+latency_random = random.Random(os.getenv("REPLAY_SEED"))
+random_lock = threading.Lock()
+replay_stats = {"recorded": 0, "replayed": 0, "missing": 0}
+stats_lock = threading.Lock()
+
+
+class ReplayMiss(Exception):
+    pass
+
+
+class ReplayObject(dict):
+    # Recorded JSON with attribute access, standing in for OpenAIObject / LlamaParse models
+    def __getattr__(self, name):
+        try:
+            return wrap(self[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return wrap(dict.__getitem__(self, name))
+
+    def get(self, name, default=None):
+        return wrap(dict.get(self, name, default))
+
+
+def wrap(value):
+    if isinstance(value, dict) and not isinstance(value, ReplayObject):
+        return ReplayObject(value)
+    if isinstance(value, list):
+        return [wrap(item) for item in value]
+    return value
+
+
+def is_recording():
+    return REPLAY_MODE == "record"
+
+
+def is_replaying():
+    return REPLAY_MODE == "replay"
+
+
+def count_replay_stat(name):
+    with stats_lock:
+        replay_stats[name] += 1
+
+
+def fixture_key(provider, request):
+    # API keys never reach the request dicts, so fixtures are shareable
+    return hashlib.sha256(json.dumps([provider, request], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def fixture_path(provider, key):
+    return os.path.join(REPLAY_DIR, provider, key[:2], key + ".json")
+
+
+def write_fixture(path, fixture):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+    count_replay_stat("recorded")
+
+
+def read_fixture(path, provider):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            fixture = json.load(f)
+    except (OSError, ValueError):
+        count_replay_stat("missing")
+        raise ReplayMiss(f"No {provider} fixture at {path}; record one with REPLAY_MODE=record")
+    count_replay_stat("replayed")
+    return fixture
+
+
+def sample_latency(provider, recorded):
+    spec = os.getenv(f"REPLAY_LATENCY_{provider.upper()}", REPLAY_LATENCY)
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    with random_lock:
+        if kind == "none":
+            seconds = 0.0
+        elif kind == "fixed":
+            seconds = values[0]
+        elif kind == "uniform":
+            seconds = latency_random.uniform(values[0], values[1])
+        elif kind == "lognormal":
+            seconds = latency_random.lognormvariate(math.log(values[0]), values[1])
+        else:
+            seconds = recorded or 0.0
+    return max(0.0, seconds * REPLAY_LATENCY_SCALE)
+
+
+def replayable_call(provider, request, call):
+    # request must be JSON-serialisable and fully describe the call
+    if REPLAY_MODE not in ("record", "replay"):
+        return call()
+
+    path = fixture_path(provider, fixture_key(provider, request))
+    if is_replaying():
+        fixture = read_fixture(path, provider)
+        delay = sample_latency(provider, fixture.get("latency"))
+        if fixture.get("chunks") is not None:
+            return replay_stream(fixture["chunks"], delay)
+        time.sleep(delay)
+        return wrap(fixture["response"])
+
+    start = time.monotonic()
+    response = call()
+    if request.get("stream"):
+        return record_stream(path, response, start)
+    write_fixture(path, {
+        "provider": provider,
+        "latency": time.monotonic() - start,
+        "response": json.loads(json.dumps(response, default=str)),
+    })
+    return response
+
+
+def record_stream(path, stream, start):
+    chunks = []
+    latency = None
+    for chunk in stream:
+        if latency is None:
+            latency = time.monotonic() - start  # time to first chunk
+        chunks.append(json.loads(json.dumps(chunk, default=str)))
+        yield chunk
+    # Only complete streams become fixtures
+    write_fixture(path, {"provider": "openai", "latency": latency, "chunks": chunks})
+
+
+def replay_stream(chunks, delay):
+    time.sleep(delay)
+    for chunk in chunks:
+        yield wrap(chunk)
+
+
+def dump_model(model):
+    # Replayed and cached pages are already plain JSON (vars() of a ReplayObject is empty)
+    if isinstance(model, dict):
+        return dict(model)
+    for method in ("model_dump", "dict"):
+        if hasattr(model, method):
+            try:
+                return getattr(model, method)()
+            except Exception:
+                pass
+    return dict(vars(model)) if hasattr(model, "__dict__") else model
+
+
+def replayable_parse(doc_path, options, parse):
+    # parse() runs LlamaParse; the fixture is keyed on the document bytes and parser options
+    if REPLAY_MODE not in ("record", "replay"):
+        return parse()
+
+    with open(doc_path, "rb") as f:
+        doc_hash = hashlib.sha256(f.read()).hexdigest()
+    key = fixture_key("llamaparse", {"document_sha256": doc_hash, "options": options})
+    fixture_dir = os.path.join(REPLAY_DIR, "llamaparse", key)
+    path = os.path.join(fixture_dir, "result.json")
+
+    if is_replaying():
+        fixture = read_fixture(path, "llamaparse")
+        time.sleep(sample_latency("llamaparse", fixture.get("latency")))
+        return ReplayParseResult(fixture, fixture_dir)
+
+    start = time.monotonic()
+    result = parse()
+    fixture = snapshot_parse_result(result, fixture_dir, time.monotonic() - start)
+    write_fixture(path, fixture)
+    return ReplayParseResult(fixture, fixture_dir)
+
+
+def snapshot_parse_result(result, snapshot_dir, latency):
+    # Download every image once into snapshot_dir/images, so copies can be handed out later
+    image_dir = os.path.join(snapshot_dir, "images")
+    shutil.rmtree(image_dir, ignore_errors=True)
+    os.makedirs(image_dir, exist_ok=True)
+    images = []
+    with tempfile.TemporaryDirectory() as download_dir:
+        try:
+            image_docs = result.get_image_documents(
+                include_screenshot_images=True,
+                include_object_images=True,
+                image_download_dir=download_dir
+            )
+        except Exception as e:
+            print(f"[WARNING] Could not save LlamaParse images: {e}")
+            image_docs = []
+        for image_doc in image_docs:
+            name = os.path.basename(image_doc.image_path)
+            shutil.copyfile(image_doc.image_path, os.path.join(image_dir, name))
+            record = {"file": name}
+            for attr in ("page_index", "context_text", "text_offset", "metadata"):
+                if getattr(image_doc, attr, None) is not None:
+                    record[attr] = getattr(image_doc, attr)
+            images.append(record)
+
+    return {
+        "latency": latency,
+        "text_documents": [doc.text for doc in result.get_text_documents(split_by_page=False)],
+        "pages": [dump_model(page) for page in result.pages],
+        "images": images,
+    }
+
+
+class ReplayParseResult:
+    # The parts of a LlamaParse JobResult the pipeline uses, served from a fixture or cache snapshot
+    def __init__(self, fixture, fixture_dir):
+        self.fixture = fixture
+        self.fixture_dir = fixture_dir
+        self.pages = [wrap(page) for page in fixture["pages"]]
+
+    def get_text_documents(self, split_by_page=False):
+        if split_by_page:
+            return [ReplayObject({"text": page.get("text") or ""}) for page in self.pages]
+        return [ReplayObject({"text": text}) for text in self.fixture["text_documents"]]
+
+    def get_image_documents(self, include_screenshot_images=True, include_object_images=True, image_download_dir=None):
+        image_download_dir = image_download_dir or tempfile.mkdtemp()
+        os.makedirs(image_download_dir, exist_ok=True)
+        documents = []
+        for record in self.fixture["images"]:
+            image_path = os.path.join(image_download_dir, record["file"])
+            shutil.copyfile(os.path.join(self.fixture_dir, "images", record["file"]), image_path)
+            documents.append(ReplayObject(dict(record, image_path=image_path)))
+        return documents
+
+
+def print_replay_stats():
+    if REPLAY_MODE in ("record", "replay"):
+        print(
+            f"[INFO] Replay ({REPLAY_MODE}): {replay_stats['recorded']} fixtures recorded, "
+            f"{replay_stats['replayed']} replayed, {replay_stats['missing']} missing"
+        )
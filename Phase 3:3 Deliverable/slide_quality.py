@@ -0,0 +1,101 @@
+# slide_quality.py
+#
+# Local, LLM-free quality checks for enriched slides. Refinement is an extra
+# model round-trip, so only slides that fail one of these heuristics are sent
+# to it:
+#   - too few or too many bullets (image and table slides need fewer)
+#   - bullets that are too short to say anything or too long to read
+#   - bullets repeating n-grams already used on earlier slides
+#   - bullets restating the slide's own table
+
+import os
+import re
+
+REFINE_SELECTIVE = os.getenv("REFINE_SELECTIVE", "1") == "1"
+MIN_BULLETS = int(os.getenv("QUALITY_MIN_BULLETS", "2"))
+MAX_BULLETS = int(os.getenv("QUALITY_MAX_BULLETS", "6"))
+MIN_BULLET_WORDS = int(os.getenv("QUALITY_MIN_BULLET_WORDS", "3"))
+MAX_BULLET_WORDS = int(os.getenv("QUALITY_MAX_BULLET_WORDS", "30"))
+MAX_REPEATED_NGRAMS = float(os.getenv("QUALITY_MAX_REPEATED_NGRAMS", "0.3"))
+MAX_TABLE_OVERLAP = float(os.getenv("QUALITY_MAX_TABLE_OVERLAP", "0.6"))
+NGRAM_SIZE = 3
+
+BULLET_PREFIX = re.compile(r'^[\s•\-\*]+')
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def split_bullets(text):
+    bullets = []
+    for line in str(text or "").splitlines():
+        line = BULLET_PREFIX.sub("", line).strip()
+        if line:
+            bullets.append(line)
+    return bullets
+
+
+def tokens(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def ngrams(words, n=NGRAM_SIZE):
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def table_tokens(table):
+    words = set()
+    for row in table or []:
+        cells = row.values() if isinstance(row, dict) else row if isinstance(row, (list, tuple)) else [row]
+        for cell in cells:
+            words.update(tokens(cell))
+    return words
+
+
+def slide_issues(slide, seen_ngrams):
+    issues = []
+    bullets = split_bullets(slide.get("text"))
+    has_table = bool(slide.get("table"))
+
+    # A table carries the content, so a single line of context is enough;
+    # an image slide may have no text at all, and refinement can't change the image
+    min_bullets = 0 if slide.get("image") else 1 if has_table else MIN_BULLETS
+    if len(bullets) < min_bullets:
+        issues.append(f"{len(bullets)} bullets")
+    elif len(bullets) > MAX_BULLETS:
+        issues.append(f"{len(bullets)} bullets")
+
+    lengths = [len(bullet.split()) for bullet in bullets]
+    if any(length < MIN_BULLET_WORDS for length in lengths):
+        issues.append("bullet too short")
+    if any(length > MAX_BULLET_WORDS for length in lengths):
+        issues.append("bullet too long")
+
+    words = tokens(" ".join(bullets))
+    slide_ngrams = ngrams(words)
+    if slide_ngrams:
+        repeated = len(slide_ngrams & seen_ngrams) / len(slide_ngrams)
+        if repeated > MAX_REPEATED_NGRAMS:
+            issues.append(f"{repeated:.0%} of phrases repeat earlier slides")
+
+    if has_table and words:
+        cells = table_tokens(slide["table"])
+        overlap = sum(1 for word in words if word in cells) / len(words)
+        if overlap > MAX_TABLE_OVERLAP:
+            issues.append(f"bullets restate the table ({overlap:.0%})")
+
+    return issues
+
+
+def slides_needing_refinement(slides):
+    # Indices of slides that fail at least one check, in deck order
+    if not REFINE_SELECTIVE:
+        return list(range(len(slides)))
+
+    failing = []
+    seen_ngrams = set()
+    for idx, slide in enumerate(slides):
+        issues = slide_issues(slide, seen_ngrams)
+        if issues:
+            print(f"[DEBUG] Slide {idx+1} '{slide.get('title', '')}' needs refinement: {', '.join(issues)}")
+            failing.append(idx)
+        seen_ngrams |= ngrams(tokens(" ".join(split_bullets(slide.get("text")))))
+    return failing
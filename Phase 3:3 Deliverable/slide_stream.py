@@ -0,0 +1,115 @@
+# slide_stream.py
+#
+# Incremental parser for the slide JSON array returned by the enrichment prompt.
+# Text arrives in arbitrary pieces (e.g. streamed completion deltas); each
+# top-level object of the array is yielded as soon as its closing brace is
+# seen, without waiting for the rest of the response. Whatever follows the
+# closing bracket is still read, so a generator feeding the chunks runs to its
+# end (and does its bookkeeping there) instead of being left suspended.
+#
+# The same scanner backs parse_slide_array, which tolerates the usual model
+# output defects (prose or code fences around the array, trailing commas) and
+# salvages every complete slide from an array cut off at max_tokens.
+
+import re
+import json
+
+TRAILING_COMMA = re.compile(r',(\s*[}\]])')
+
+
+def iter_slide_objects(chunks, state=None):
+    # state, if given, gets state["closed"] = True once the array's closing bracket is seen
+    in_array = False
+    depth = 0
+    in_string = False
+    escaped = False
+    buffer = []
+
+    chunks = iter(chunks)
+    for chunk in chunks:
+        if not chunk:
+            continue
+        for ch in chunk:
+            if not in_array:
+                # Skip any prose or code fence before the array starts
+                if ch == '[':
+                    in_array = True
+                continue
+
+            if depth == 0:
+                if ch == '{':
+                    depth = 1
+                    buffer = [ch]
+                elif ch == ']':
+                    if state is not None:
+                        state["closed"] = True
+                    for _ in chunks:
+                        pass
+                    return
+                continue
+
+            buffer.append(ch)
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == '\\':
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch in '{[':
+                depth += 1
+            elif ch in '}]':
+                depth -= 1
+                if depth == 0:
+                    raw = "".join(buffer)
+                    buffer = []
+                    slide = load_object(raw)
+                    if slide is None:
+                        print(f"[WARNING] Skipping malformed slide object: {raw[:80]}...")
+                    else:
+                        yield slide
+
+
+def strip_trailing_commas(raw):
+    # Only commas outside string literals are removed
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', raw)
+    return "".join(part if i % 2 else TRAILING_COMMA.sub(r'\1', part) for i, part in enumerate(parts))
+
+
+def load_object(raw):
+    for candidate in (raw, strip_trailing_commas(raw)):
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def parse_slide_array(text):
+    # Returns (slides, complete); complete is False when the array was cut off
+    # and slides then holds every object that closed before the cut
+    if not text:
+        return [], False
+    try:
+        slides = json.loads(text)
+        if isinstance(slides, list):
+            return slides, True
+    except json.JSONDecodeError:
+        pass
+
+    state = {"closed": False}
+    slides = list(iter_slide_objects([text], state))
+    return slides, state["closed"]
+
+
+def is_slide_json(text):
+    slides, complete = parse_slide_array(text)
+    return complete
+
+
+def has_slides(text):
+    # A cut-off array that still yields slides is recoverable: the caller asks for the tail
+    slides, complete = parse_slide_array(text)
+    return complete or bool(slides)
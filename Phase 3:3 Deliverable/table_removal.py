@@ -0,0 +1,143 @@
+# table_removal.py
+#
+# Finds where guessed tables sit in the document text, so their rows can be
+# cut out before chunking (otherwise the same figures come back as bullet
+# slides). Every cell of every table goes into one Aho-Corasick automaton and
+# the text is scanned once. Cell matches on one line separated only by table
+# punctuation and whitespace are joined into runs. A run is cut when it fills
+# its whole line (at least two cells, or one long cell), or when it holds
+# several cells with a "|" border between them; border-only lines between cut
+# rows (markdown rules, blank lines) go with them. Cell values inside running
+# prose ("In 2021 Revenue grew") never fill their line, so the prose stays
+# intact, spaces included.
+
+import os
+from collections import deque
+
+TABLE_CELL_MIN_CHARS = int(os.getenv("TABLE_CELL_MIN_CHARS", "12"))
+
+# Characters allowed between the cells of one row (cell borders, padding)
+ROW_SEPARATORS = set(" \t|-:+")
+# Characters allowed between two cut rows (markdown rules, line breaks)
+SEPARATORS = ROW_SEPARATORS | set("\r\n")
+LINE_PADDING = set(" \t|")
+
+
+def build_automaton(patterns):
+    goto = [{}]
+    fail = [0]
+    output = [[]]
+    for pattern in patterns:
+        node = 0
+        for ch in pattern:
+            following = goto[node].get(ch)
+            if following is None:
+                following = len(goto)
+                goto[node][ch] = following
+                goto.append({})
+                fail.append(0)
+                output.append([])
+            node = following
+        output[node].append(len(pattern))
+
+    # Breadth-first, so every failure link points at an already finished node
+    queue = deque(goto[0].values())
+    while queue:
+        node = queue.popleft()
+        for ch, following in goto[node].items():
+            queue.append(following)
+            state = fail[node]
+            while state and ch not in goto[state]:
+                state = fail[state]
+            fail[following] = goto[state].get(ch, 0)
+            output[following] = output[following] + output[fail[following]]
+    return goto, fail, output
+
+
+def find_matches(automaton, text):
+    # All (start, end) occurrences of every pattern, in one pass over the text
+    goto, fail, output = automaton
+    matches = []
+    node = 0
+    for position, ch in enumerate(text):
+        while node and ch not in goto[node]:
+            node = fail[node]
+        node = goto[node].get(ch, 0)
+        for length in output[node]:
+            matches.append((position + 1 - length, position + 1))
+    return matches
+
+
+def is_word_bounded(text, start, end):
+    # "Yes" must not match inside "Yesterday"
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+
+def select_matches(text, matches):
+    # Leftmost-longest, non-overlapping, whole-word matches
+    selected = []
+    last_end = 0
+    for start, end in sorted(matches, key=lambda m: (m[0], -m[1])):
+        if start >= last_end and is_word_bounded(text, start, end):
+            selected.append((start, end))
+            last_end = end
+    return selected
+
+
+def expand_to_line(text, start, end):
+    # Take the row's borders along, and the line break too if nothing else is left on the line
+    while start > 0 and text[start - 1] in LINE_PADDING:
+        start -= 1
+    while end < len(text) and text[end] in LINE_PADDING:
+        end += 1
+    if (start == 0 or text[start - 1] == "\n") and end < len(text) and text[end] == "\n":
+        end += 1
+    return start, end
+
+
+def whole_line(text, start, end):
+    start, end = expand_to_line(text, start, end)
+    return (start == 0 or text[start - 1] == "\n") and (end == len(text) or text[end - 1] == "\n")
+
+
+def table_cells(tables):
+    cells = set()
+    for table in tables:
+        for row in table:
+            for cell in row:
+                cell = str(cell).strip()
+                if any(ch.isalnum() for ch in cell):
+                    cells.add(cell)
+    return cells
+
+
+def find_table_spans(text, tables):
+    # Sorted, non-overlapping [start, end) spans of table rows to cut from text
+    cells = table_cells(tables)
+    if not cells or not text:
+        return []
+    matches = select_matches(text, find_matches(build_automaton(cells), text))
+
+    # Join matches on the same line with only separators between them into runs
+    runs = []
+    for start, end in matches:
+        if runs and all(ch in ROW_SEPARATORS for ch in text[runs[-1][1]:start]):
+            runs[-1][1] = end
+            runs[-1][2] += 1
+        else:
+            runs.append([start, end, 1])
+
+    spans = []
+    for start, end, count in runs:
+        if whole_line(text, start, end):
+            if count < 2 and end - start < TABLE_CELL_MIN_CHARS:
+                continue
+            start, end = expand_to_line(text, start, end)
+        elif count < 2 or "|" not in text[start:end]:
+            continue
+        # Mid-line rows are cut exactly, so the surrounding text keeps its spacing
+        if spans and all(ch in SEPARATORS for ch in text[spans[-1][1]:start]):
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+    return spans
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The pipeline modules are plain scripts in the deliverable directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
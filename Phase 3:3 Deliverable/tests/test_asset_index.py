@@ -0,0 +1,16 @@
+from asset_index import anchor_span, build_asset_positions, locate_pages, scope_assets
+
+
+def test_unfound_page_is_left_unplaced():
+    text = "Page one text here. Page three text here."
+    spans = locate_pages(text, ["Page one text here.", "Nowhere in the document", "Page three text here."])
+    assert spans == [[0, 20], None, [20, len(text)]]
+
+    # An asset on the lost page that can't be found anywhere stays visible to every segment
+    table_span = anchor_span(text, spans, 1, "not there")
+    assert table_span is None
+    document_data = {
+        "images": [], "tables": [[["x"]]],
+        "asset_positions": build_asset_positions(text, {}, [table_span]),
+    }
+    assert scope_assets(document_data, 6, 8, window=0)[1] == [[["x"]]]
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+import batch_client
+import llm_cache
+import llm_telemetry
+from batch_client import run_chat_batch
+from batch_standin import default_responder, start_standin_server
+from prompt_templates import ENRICH_PRESENTATION_PROMPT, EXTRACT_TOPICS_MARKERS_TEMPLATE, SLIDE_WINDOW_REFINEMENT_PROMPT
+from slide_stream import parse_slide_array
+
+PARAGRAPHS = [
+    "Solar capacity doubled across the region in the last five years. Costs per panel fell by half. "
+    "Most new installations are on residential rooftops. Grid operators now plan for midday surpluses.",
+    "Battery storage is the next bottleneck for the grid. Lithium prices remain volatile. "
+    "Pumped hydro still provides most of the stored energy. New chemistries are entering pilot projects.",
+]
+TABLE = [["Year", "Capacity"], ["2019", "12 GW"], ["2024", "25 GW"]]
+
+
+@pytest.fixture
+def standin(monkeypatch, tmp_path):
+    prompts = []
+
+    def responder(body):
+        prompts.append(body["messages"][-1]["content"])
+        return default_responder(body)
+
+    monkeypatch.setattr(llm_cache, "CACHE_DIR", str(tmp_path / "llm_cache"))
+    monkeypatch.setattr(llm_telemetry, "TELEMETRY_ENABLED", False)
+    monkeypatch.setattr(batch_client, "BATCH_POLL_INTERVAL", 0)
+    server, base_url = start_standin_server(responder)
+    monkeypatch.setattr(batch_client, "BATCH_API_BASE", base_url)
+    yield prompts
+    server.shutdown()
+
+
+def test_run_chat_batch_answers_each_stage(standin):
+    text = " ".join(" ".join(PARAGRAPHS).split())
+    slides = [{"title": "Solar", "text": "• Capacity doubled", "image": "", "table": []}]
+    prompts = {
+        "topics": EXTRACT_TOPICS_MARKERS_TEMPLATE.replace("{{content}}", text),
+        "enrich": ENRICH_PRESENTATION_PROMPT.format(
+            text_content=text, image_paths=[], table_data=json.dumps([TABLE], indent=2)
+        ),
+        "refine": SLIDE_WINDOW_REFINEMENT_PROMPT.format(
+            slide_count=1, deck_summary="", original_slide_json=json.dumps(slides, indent=2)
+        ),
+    }
+    results = run_chat_batch("test-key", prompts)
+
+    markers = results["topics"].split("\n")
+    assert markers[0].startswith("**") and markers[0].endswith("**")
+    assert all(text.find(sample) != -1 for sample in markers[1::2])
+
+    enriched, complete = parse_slide_array(results["enrich"])
+    assert complete
+    assert [slide["table"] for slide in enriched if slide["table"]] == [TABLE]
+    assert all(slide["text"].startswith("• ") for slide in enriched if not slide["table"])
+
+    assert json.loads(results["refine"]) == slides
+    assert len(standin) == 3
+
+
+def test_main_batch_builds_decks_offline(standin, monkeypatch, tmp_path):
+    for module in ("docx", "pptx", "dotenv", "llama_cloud_services", "fuzzywuzzy", "markdownify"):
+        pytest.importorskip(module)
+    import docx
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    import FinalCode
+
+    doc_path = tmp_path / "energy.docx"
+    document = docx.Document()
+    for paragraph in PARAGRAPHS:
+        document.add_paragraph(paragraph)
+    table = document.add_table(rows=len(TABLE), cols=len(TABLE[0]))
+    for r, row in enumerate(TABLE):
+        for c, cell in enumerate(row):
+            table.cell(r, c).text = cell
+    document.save(doc_path)
+
+    decks = {}
+    monkeypatch.setattr(FinalCode, "base_dir", str(tmp_path))
+    monkeypatch.setattr(FinalCode, "intermediate_dir", str(tmp_path))
+    monkeypatch.setattr(
+        FinalCode, "create_ppt_from_gpt",
+        lambda slides, document_data, ppt_path, template_path=None: decks.update({ppt_path: slides})
+    )
+    FinalCode.main_batch([str(doc_path)], output_dir=str(tmp_path / "output"))
+
+    slides = decks[str(tmp_path / "output" / "energy_presentation.pptx")]
+    assert any("Solar capacity doubled" in slide["text"] for slide in slides)
+    assert any(slide["table"] for slide in slides)
+    # Topics, enrichment and refinement each went through the stand-in
+    assert any("Now extract from the document below:" in prompt for prompt in standin)
+    assert any("Document text:\n" in prompt for prompt in standin)
+    assert any("original slide JSON" in prompt for prompt in standin)
@@ -0,0 +1,37 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import allow_request, record_failure, release_probe
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "breakers", {})
+    monkeypatch.setattr(circuit_breaker, "BREAKER_COOLDOWN", 60)
+
+
+def open_past_cooldown(name):
+    record_failure(name, trip=True)
+    circuit_breaker.breakers[name]["opened_at"] -= 61
+
+
+def test_released_probe_goes_to_the_next_caller():
+    open_past_cooldown("openai")
+    assert allow_request("openai")
+    assert not allow_request("openai")
+    release_probe("openai")
+    assert allow_request("openai")
+
+
+def test_unroutable_call_leaves_the_provider_probe_alone(monkeypatch):
+    for module in ("openai", "pptx", "dotenv", "llama_cloud_services", "fuzzywuzzy"):
+        pytest.importorskip(module)
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    import FinalCode
+
+    open_past_cooldown("openai")
+    record_failure("openai:gpt-4", trip=True)
+    record_failure(f"openai:{FinalCode.fallback_model('gpt-4')}", trip=True)
+
+    assert FinalCode.request_gpt_completion("test-key", "Make slides", deadline=1, model="gpt-4") is None
+    assert allow_request("openai")
@@ -0,0 +1,22 @@
+import parse_cache
+from parse_cache import cached_parse
+from replay_harness import ReplayParseResult
+
+PAGE = {"text": "Revenue by year", "structuredData": {"tables": [[["Year", "Revenue"], ["2021", "100"]]]}}
+
+
+def test_replayed_result_is_cached_intact(monkeypatch, tmp_path):
+    # Under REPLAY_MODE the parser already returns a snapshot of dict-based pages
+    monkeypatch.setattr(parse_cache, "PARSE_CACHE_DIR", str(tmp_path / "parse_cache"))
+    doc_path = tmp_path / "doc.docx"
+    doc_path.write_bytes(b"document bytes")
+    replayed = ReplayParseResult({"text_documents": [PAGE["text"]], "pages": [PAGE], "images": []}, str(tmp_path))
+
+    first, first_hit = cached_parse(str(doc_path), {"language": "en"}, lambda: replayed)
+    second, second_hit = cached_parse(str(doc_path), {"language": "en"}, lambda: None)
+
+    assert (first_hit, second_hit) == (False, True)
+    for result in (first, second):
+        assert result.pages[0].text == PAGE["text"]
+        assert result.pages[0].structuredData == PAGE["structuredData"]
+        assert result.get_text_documents()[0].text == PAGE["text"]
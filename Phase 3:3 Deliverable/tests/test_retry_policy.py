@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+import llm_telemetry
+import retry_policy
+from retry_policy import call_with_retries, remaining_time
+
+
+class Flaky(Exception):
+    pass
+
+
+@pytest.mark.parametrize("max_attempts", [0, 1])
+def test_retries_off_still_makes_one_attempt_and_raises(monkeypatch, max_attempts):
+    monkeypatch.setattr(retry_policy.time, "sleep", lambda seconds: pytest.fail("slept with retries off"))
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise Flaky("busy")
+
+    with pytest.raises(Flaky):
+        call_with_retries(call, (Flaky,), max_attempts=max_attempts)
+    assert len(calls) == 1
+
+
+def test_remaining_time_counts_down_to_a_floor():
+    start = time.monotonic()
+    assert 9 < remaining_time(start, 10) <= 10
+    assert remaining_time(start - 60, 10) == 1.0
+
+
+def test_openai_attempt_is_bounded_by_the_deadline(monkeypatch):
+    for module in ("openai", "pptx", "dotenv", "llama_cloud_services", "fuzzywuzzy"):
+        pytest.importorskip(module)
+    import openai
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    import FinalCode
+
+    timeouts = []
+
+    def create(request_timeout=None, **request):
+        timeouts.append(request_timeout)
+        return {"choices": [{"message": {"content": "ok"}}], "usage": {}}
+
+    monkeypatch.setattr(llm_telemetry, "TELEMETRY_ENABLED", False)
+    monkeypatch.setattr(openai.ChatCompletion, "create", create)
+    FinalCode.tracked_chat_completion("gpt-4", 10, {"messages": [], "max_tokens": 16}, deadline=30)
+    assert timeouts and 0 < timeouts[0] <= 30
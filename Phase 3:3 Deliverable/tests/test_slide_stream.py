@@ -0,0 +1,51 @@
+import pytest
+
+import llm_cache
+import llm_telemetry
+from slide_stream import iter_slide_objects, parse_slide_array
+
+CHUNKS = ['Here you go:\n[{"title": "A", "text": "• one"}', ', {"title": "B", "text": "• two"}', ']', '\n']
+
+
+def test_source_runs_to_its_end_after_the_array_closes():
+    finished = []
+
+    def source():
+        yield from CHUNKS
+        finished.append(True)
+
+    state = {"closed": False}
+    assert [slide["title"] for slide in iter_slide_objects(source(), state)] == ["A", "B"]
+    assert state["closed"] and finished
+
+
+def test_cut_off_array_keeps_complete_slides():
+    assert parse_slide_array("".join(CHUNKS[:2]) + ', {"title": "C"') == (
+        [{"title": "A", "text": "• one"}, {"title": "B", "text": "• two"}], False
+    )
+
+
+def test_streamed_enrichment_is_cached_and_recorded(monkeypatch, tmp_path):
+    for module in ("openai", "pptx", "dotenv", "llama_cloud_services", "fuzzywuzzy"):
+        pytest.importorskip(module)
+    import openai
+
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    import FinalCode
+
+    monkeypatch.setattr(llm_cache, "CACHE_DIR", str(tmp_path / "llm_cache"))
+    monkeypatch.setattr(llm_telemetry, "TELEMETRY_ENABLED", False)
+    monkeypatch.setattr(openai.ChatCompletion, "create", lambda **request: (
+        {"choices": [{"delta": {"content": chunk}}]} for chunk in CHUNKS
+    ))
+    records = len(llm_telemetry.run_records)
+
+    slides = list(iter_slide_objects(FinalCode.stream_api_call_gpt(
+        "test-key", "Make slides", max_tokens=256, model="gpt-4", should_cache=FinalCode.is_slide_json
+    )))
+
+    assert [slide["title"] for slide in slides] == ["A", "B"]
+    key = llm_cache.make_cache_key("openai", "gpt-4", {"max_tokens": 256, "temperature": 0.3}, "Make slides")
+    assert llm_cache.cache_get(key) == "".join(CHUNKS).strip()
+    [record] = llm_telemetry.run_records[records:]
+    assert record["ok"] and record["model"] == "gpt-4" and record["completion_tokens"] > 0
@@ -0,0 +1,42 @@
+from asset_index import cut_tracking_spans
+from table_removal import find_table_spans
+
+TABLES = [[["Year", "Revenue"], ["2021", "100"]]]
+
+
+def remove_tables(text, tables, spans=()):
+    return cut_tracking_spans(text, find_table_spans(text, tables), list(spans))
+
+
+def test_cell_values_in_prose_are_kept():
+    text = "In 2021 Revenue grew strongly.\n| Year | Revenue |\n|---|---|\n| 2021 | 100 |\nDone."
+    assert remove_tables(text, TABLES) == "In 2021 Revenue grew strongly.\nDone."
+
+
+def test_rows_without_borders_are_cut_line_by_line():
+    text = "Intro\nYear\tRevenue\n2021\t100\nAfter"
+    assert remove_tables(text, TABLES) == "Intro\nAfter"
+
+
+def test_short_cell_is_not_cut_from_prose():
+    text = "Did it work? Yes, it did.\nYes\n"
+    assert remove_tables(text, [[["Yes", "No"]]]) == text
+
+
+def test_tracked_spans_follow_the_cut():
+    text = "Intro\n| Year | Revenue |\n| 2021 | 100 |\nAfter"
+    after = [text.index("After")] * 2
+    inside = [text.index("| 2021")] * 2
+    result = remove_tables(text, TABLES, [after, inside])
+    assert result == "Intro\nAfter"
+    assert result[after[0]:].startswith("After")
+    assert inside == [len("Intro\n")] * 2
+
+
+def test_table_anchor_skips_prose_mentions():
+    from asset_index import locate_in_spans, table_snippet
+
+    text = "Year on year we grew.\n| Year | Revenue |\n| 2021 | 100 |\nAfter"
+    cuts = find_table_spans(text, TABLES)
+    span = locate_in_spans(text, table_snippet(TABLES[0]), cuts)
+    assert span[0] == text.index("| Year") + 2
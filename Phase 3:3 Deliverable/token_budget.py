@@ -0,0 +1,177 @@
+# token_budget.py
+#
+# Token-budget planning for LLM requests. Prompts are measured with tiktoken
+# when it is installed (falling back to a characters-per-token estimate).
+# The expected output (slides for the segment's text plus the tables the model
+# copies into them) is a floor: segments are split or merged so that the
+# prompt and that much output fit the model's context window, and max_tokens
+# is whatever room the window leaves, up to the model's output limit.
+
+import os
+import json
+import math
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-3.5-turbo": 16385,
+    "claude-3-5-sonnet-20241022": 200000,
+}
+MAX_OUTPUT_TOKENS = {
+    "gpt-4": 4096,
+    "gpt-4-turbo": 4096,
+    "gpt-3.5-turbo": 4096,
+    "claude-3-5-sonnet-20241022": 8192,
+}
+
+# Roughly one slide per 200 tokens of source text, each slide ~180 tokens of JSON
+CONTENT_TOKENS_PER_SLIDE = int(os.getenv("CONTENT_TOKENS_PER_SLIDE", "200"))
+TOKENS_PER_SLIDE = int(os.getenv("TOKENS_PER_SLIDE", "180"))
+RESPONSE_OVERHEAD = 100
+SAFETY_MARGIN = 64
+MIN_SEGMENT_TOKENS = int(os.getenv("MIN_SEGMENT_TOKENS", "150"))
+
+encoders = {}
+
+
+def get_encoder(model):
+    if model not in encoders:
+        try:
+            encoders[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoders[model] = tiktoken.get_encoding("cl100k_base")
+    return encoders[model]
+
+
+def count_tokens(text, model="gpt-4"):
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, len(text) // 4)
+    return len(get_encoder(model).encode(text, disallowed_special=()))
+
+
+def context_window(model):
+    return CONTEXT_WINDOWS.get(model, 8192)
+
+
+def expected_slide_count(content, model="gpt-4"):
+    return max(1, math.ceil(count_tokens(content, model) / CONTENT_TOKENS_PER_SLIDE))
+
+
+def expected_output_tokens(content, model="gpt-4", tables=None):
+    # Slides for the text, plus the tables the model copies verbatim into "table" fields
+    tokens = expected_slide_count(content, model) * TOKENS_PER_SLIDE + RESPONSE_OVERHEAD
+    if tables:
+        tokens += count_tokens(json.dumps(tables), model)
+    return tokens
+
+
+def plan_max_tokens(prompt, model="gpt-4", expected_tokens=None, minimum=256):
+    # expected_tokens is an estimate, so it is never used to cut the reply short;
+    # it only flags prompts that leave less room than the reply is likely to need
+    prompt_tokens = count_tokens(prompt, model)
+    room = context_window(model) - prompt_tokens - SAFETY_MARGIN
+    cap = min(MAX_OUTPUT_TOKENS.get(model, 4096), room)
+    if cap < minimum:
+        print(f"[WARNING] Prompt of {prompt_tokens} tokens leaves only {cap} tokens of output room on {model}.")
+        return max(cap, 1)
+    if expected_tokens is not None and expected_tokens > cap:
+        print(f"[WARNING] Expected ~{expected_tokens} output tokens but only {cap} fit on {model}; the reply may be cut off.")
+    return cap
+
+
+def split_text_by_tokens(text, max_tokens, model="gpt-4"):
+    # Greedy split on word boundaries; the joined chunks use single spaces,
+    # matching the word-based splitter it replaces
+    chunks = []
+    current = []
+    current_tokens = 0
+    for word in text.split():
+        word_tokens = count_tokens(" " + word, model)
+        if current and current_tokens + word_tokens > max_tokens:
+            chunks.append(" ".join(current))
+            current = []
+            current_tokens = 0
+        current.append(word)
+        current_tokens += word_tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def segment_fits(segment, build_prompt, model, expected_output=None):
+    prompt = build_prompt(segment)
+    planned = expected_output(segment) if expected_output else expected_output_tokens(segment["content"], model)
+    planned = min(planned, MAX_OUTPUT_TOKENS.get(model, 4096))
+    return count_tokens(prompt, model) + planned + SAFETY_MARGIN <= context_window(model)
+
+
+def split_segment(segment, build_prompt, model, expected_output=None):
+    if segment_fits(segment, build_prompt, model, expected_output):
+        return [segment]
+
+    # Budget for the content itself: whatever the fixed part of the prompt and
+    # the expected output (proportional to the content) leave over
+    overhead = count_tokens(build_prompt({"topic": segment["topic"], "content": ""}), model)
+    output_ratio = TOKENS_PER_SLIDE / CONTENT_TOKENS_PER_SLIDE
+    # (one extra slide of output covers rounding up the slide count)
+    budget = int((context_window(model) - overhead - RESPONSE_OVERHEAD - SAFETY_MARGIN - TOKENS_PER_SLIDE) / (1 + output_ratio))
+    budget = min(budget, int((MAX_OUTPUT_TOKENS.get(model, 4096) - RESPONSE_OVERHEAD) / output_ratio))
+    if budget <= 0:
+        print(f"[WARNING] Segment '{segment['topic']}' cannot fit {model}'s context window; sending as is.")
+        return [segment]
+
+    pieces = []
+    current = ""
+    for line in segment["content"].splitlines(keepends=True):
+        if current and count_tokens(current + line, model) > budget:
+            pieces.append(current)
+            current = ""
+        if count_tokens(line, model) > budget:
+            pieces.extend(split_text_by_tokens(line, budget, model))
+            continue
+        current += line
+    if current:
+        pieces.append(current)
+
+    print(f"[INFO] Split segment '{segment['topic']}' into {len(pieces)} parts to fit {model}.")
+    split = []
+    word_start = segment.get("word_start", 0)
+    for piece in pieces:
+        split.append(dict(segment, content=piece, word_start=word_start))
+        word_start += len(piece.split())
+    return split
+
+
+def fit_segments(segments, build_prompt, model="gpt-4", expected_output=None):
+    # expected_output(segment) -> output tokens; defaults to the slide estimate for its text
+    fitted = []
+    for segment in segments:
+        fitted.extend(split_segment(segment, build_prompt, model, expected_output))
+
+    # Merge tiny neighbouring segments (segments are contiguous slices of the
+    # text) so a two-line topic doesn't cost a full request of its own
+    merged = []
+    for segment in fitted:
+        if merged:
+            previous = merged[-1]
+            small = min(count_tokens(previous["content"], model), count_tokens(segment["content"], model)) < MIN_SEGMENT_TOKENS
+            candidate = dict(
+                previous,
+                topic=f"{previous['topic']} / {segment['topic']}",
+                content=previous["content"] + segment["content"],
+            )
+            if small and segment_fits(candidate, build_prompt, model, expected_output):
+                merged[-1] = candidate
+                continue
+        merged.append(segment)
+
+    if len(merged) != len(segments):
+        print(f"[INFO] Token planner: {len(segments)} topic segments -> {len(merged)} requests.")
+    return merged